@@ -0,0 +1,79 @@
+import pandas as pd
+from data_utils import HUB
+from flight_schema import STATUS_NORMS
+from instrumentation import span
+from status_parser import ONTIME_THRESHOLD_MINUTES
+
+CUBE_KEYS = ['date', 'airline', 'origin', 'destination', 'flight_type', 'codeshare', 'status_norm']
+CATEGORY_KEYS = ['airline', 'origin', 'destination', 'flight_type', 'status_norm']
+MEASURES = ['flights', 'timed', 'delay_minutes', 'late']
+# What a flight count counts: physical movements (operating flight numbers
+# only), or every flight number including the codeshares marketed on them
+MOVEMENTS = 'movements'
+FLIGHT_NUMBERS = 'flight_numbers'
+COUNTS = (MOVEMENTS, FLIGHT_NUMBERS)
+
+
+def counted(cells, count=MOVEMENTS):
+    """The cube cells that make up a count: for movements, those of operating flight numbers"""
+    return cells if count == FLIGHT_NUMBERS else cells[~cells['codeshare'].to_numpy()]
+
+
+def routed(cells):
+    """
+    The cells that make up routes: all but the hub-to-hub ones of flights
+    stored at the hub for want of their other station (see
+    data_utils.parse_hk_flights and legacy_import)
+    """
+    return cells[~((cells['origin'] == HUB) & (cells['destination'] == HUB)).to_numpy()]
+
+
+def build_cube(flights):
+    """
+    Aggregate flights per (date, airline, origin, destination, flight_type,
+    codeshare, status_norm), codeshare telling marketing flight numbers from
+    operating ones (see counted). Expects a typed flight table (see
+    flight_schema.apply_schema); the cube keeps datetime64 dates and
+    categorical keys so it can be windowed and filtered directly.
+
+    Measures: flights (row count), timed (flights whose status carries an
+    actual time), delay_minutes (sum of positive delays over the timed
+    flights) and late (timed flights more than ONTIME_THRESHOLD_MINUTES late).
+    """
+    if flights.empty:
+        cube = pd.DataFrame(columns=CUBE_KEYS + MEASURES)
+        cube['date'] = pd.to_datetime(cube['date'])
+        cube['codeshare'] = cube['codeshare'].astype(bool)
+        cube[MEASURES] = cube[MEASURES].astype('int64')
+        return cube
+    status_norm = pd.Categorical.from_codes(flights['status_code'], STATUS_NORMS)
+    keyed = flights[CUBE_KEYS[:-2]].assign(
+        codeshare=flights['codeshare'] > 0,
+        status_norm=status_norm,
+        delay=flights['delay_minutes'].clip(lower=0),
+        late=(flights['delay_minutes'] > ONTIME_THRESHOLD_MINUTES).astype('int64'),
+    )
+    with span('cube.groupby'):
+        cube = keyed.groupby(CUBE_KEYS, sort=True, observed=True, dropna=False).agg(
+            flights=('delay', 'size'),
+            timed=('delay', 'count'),
+            delay_minutes=('delay', 'sum'),
+            late=('late', 'sum'),
+        ).reset_index()
+    cube['delay_minutes'] = cube['delay_minutes'].round().astype('int64')
+    cube['date'] = pd.to_datetime(cube['date'])
+    return cube
+
+
+def update_cube(cube, flights, dates):
+    """Rebuild only the cube cells for the given 'YYYY-MM-DD' dates from the refreshed flights"""
+    dates = pd.to_datetime(sorted(set(dates)))
+    kept = cube[~cube['date'].isin(dates)]
+    fresh = build_cube(flights[flights['date'].isin(dates)])
+    with span('cube.merge'):
+        cube = pd.concat([kept, fresh], ignore_index=True)
+        # Concatenating categoricals with different categories falls back to object
+        for column in CATEGORY_KEYS:
+            if not isinstance(cube[column].dtype, pd.CategoricalDtype):
+                cube[column] = cube[column].astype('category')
+        return cube.sort_values(CUBE_KEYS, kind='stable').reset_index(drop=True)
@@ -0,0 +1,107 @@
+import json
+import os
+import pickle
+import threading
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+IATA_FILE = os.path.join(BACKEND_DIR, 'iata.json')
+CACHE_FILE = os.path.join(BACKEND_DIR, 'iata.pickle')
+FIELDS = ('name', 'continent', 'iso_country', 'iso_region', 'municipality')
+
+
+class AirportIndex:
+    """Airport details keyed by IATA code"""
+
+    def __init__(self, airports):
+        # code -> tuple of FIELDS
+        self._airports = airports
+        self._names = None
+        self._codes = None
+
+    def __len__(self):
+        return len(self._airports)
+
+    def __contains__(self, code):
+        return code in self._airports
+
+    def get(self, code):
+        """Return {'iata_code', 'name', 'continent', ...} for a code, or None"""
+        values = self._airports.get(code)
+        if values is None:
+            return None
+        return {'iata_code': code, **dict(zip(FIELDS, values))}
+
+    def name(self, code, default=None):
+        values = self._airports.get(code)
+        return values[0] if values is not None else default
+
+    def names(self):
+        """Code -> airport name dict, the shape get_airport_data() has always returned"""
+        if self._names is None:
+            self._names = {code: values[0] for code, values in self._airports.items()}
+        return self._names
+
+    def codes(self):
+        """Airport name -> code dict, leaving out names shared by several codes"""
+        if self._codes is None:
+            codes, shared = {}, set()
+            for code, name in self.names().items():
+                if name in codes:
+                    shared.add(name)
+                codes[name] = code
+            self._codes = {name: code for name, code in codes.items() if name not in shared}
+        return self._codes
+
+
+def _read_iata_json(iata_file):
+    with open(iata_file, encoding='utf-8') as f:
+        airports = json.load(f)
+    # Later entries win for duplicated codes, as the old dict comprehension did
+    return {airport['iata_code']: tuple(airport.get(field) for field in FIELDS) for airport in airports}
+
+
+def load_airport_index(iata_file=IATA_FILE, cache_file=CACHE_FILE):
+    """
+    Build the index from iata.json, going through a pickle cache that is
+    rebuilt whenever iata.json's mtime changes
+    """
+    mtime = os.path.getmtime(iata_file)
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get('mtime') == mtime and cached.get('fields') == FIELDS:
+                return AirportIndex(cached['airports'])
+        except Exception as e:
+            print(f"Ignoring unreadable airport cache {cache_file}: {str(e)}")
+
+    airports = _read_iata_json(iata_file)
+    if cache_file:
+        try:
+            tmp_path = f'{cache_file}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'mtime': mtime, 'fields': FIELDS, 'airports': airports}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_file)
+        except OSError as e:
+            print(f"Could not write airport cache {cache_file}: {str(e)}")
+    return AirportIndex(airports)
+
+
+_index = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+def get_airport_index():
+    """Process-wide airport index, reloaded only when iata.json changes on disk"""
+    global _index, _index_mtime
+    try:
+        mtime = os.path.getmtime(IATA_FILE)
+    except OSError:
+        print(f"Warning: {IATA_FILE} not found")
+        return AirportIndex({})
+    with _index_lock:
+        if _index is None or _index_mtime != mtime:
+            _index = load_airport_index()
+            _index_mtime = mtime
+        return _index
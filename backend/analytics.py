@@ -0,0 +1,320 @@
+from datetime import timedelta
+import pandas as pd
+from aggregates import MOVEMENTS, routed
+from airport_index import FIELDS, get_airport_index
+from instrumentation import span
+from kpi_engine import DEFAULT_WINDOW, baseline_window, parse_window
+
+FOCUS_CARRIER = 'CPA'
+COD_STATUSES = ['Cancelled', 'Delayed']
+
+
+def count_flights(cells):
+    """Number of flights represented by a slice of the cube"""
+    return int(cells['flights'].sum())
+
+
+def average_delay(cells):
+    """Mean minutes late (early counts as zero) over the flights whose status carries a time"""
+    timed = int(cells['timed'].sum())
+    return int(cells['delay_minutes'].sum()) / timed if timed > 0 else 0
+
+
+def weekly_counts(cells):
+    """Weekly flight counts labelled by the Sunday that closes each week, like resample('W').size()"""
+    return cells.groupby('date')['flights'].sum().resample('W').sum()
+
+
+def week_ending(dates):
+    return dates + pd.to_timedelta(6 - dates.dt.weekday, unit='d')
+
+
+def weekly_airline_ranking(cells, top_n=10):
+    """
+    Rank airlines by flight count within each week (weeks end on Sunday, ties
+    broken by airline code). Returns one row per (week, airline) with
+    rank <= top_n, holding flights, cod (cancelled or delayed flights) and
+    cod_percentage.
+    """
+    weekly = cells.assign(
+        week=week_ending(cells['date']),
+        cod=cells['flights'].where(cells['status_norm'].isin(COD_STATUSES), 0),
+    ).groupby(['week', 'airline'], sort=True, observed=True)[['flights', 'cod']].sum().reset_index()
+    weekly = weekly.sort_values(['week', 'flights'], ascending=[True, False], kind='stable')
+    weekly['rank'] = weekly.groupby('week').cumcount() + 1
+    weekly = weekly[weekly['rank'] <= top_n].reset_index(drop=True)
+    weekly['cod_percentage'] = (weekly['cod'] / weekly['flights'] * 100).round().astype('int64')
+    return weekly
+
+
+def ranking_records(ranking, weeks, columns):
+    """Group ranked rows into [{"week": ..., "airlines": [...]}], with an entry for every week"""
+    by_week = {week: rows[columns].to_dict('records') for week, rows in ranking.groupby('week')}
+    return [{"week": week.strftime('%Y-%m-%d'), "airlines": by_week.get(week, [])} for week in weeks]
+
+
+def hkia_summary(snapshot, count=MOVEMENTS):
+    with span('hkia.groupby'):
+        by_date_type = snapshot.counts(['date', 'flight_type'], count)
+        daily_flights = by_date_type.unstack(fill_value=0)
+        by_type = snapshot.counts(['flight_type'], count).sort_values(ascending=False, kind='stable')
+        by_airline = snapshot.counts(['airline'], count).sort_values(ascending=False, kind='stable')
+    dates = daily_flights.index
+    return {
+        "count": count,
+        "totalNumOfFlights": int(by_type.sum()),
+        "numOfUniqueAirlines": len(by_airline),
+        "dateRange": f"{dates.min().strftime('%Y-%m-%d')} to {dates.max().strftime('%Y-%m-%d')}",
+        "flightsByType": by_type.to_dict(),
+        "mostFreqAirlines": by_airline.head().to_dict(),
+        "avgDailyFlights": daily_flights.mean().to_dict()
+    }
+
+
+def airport_directory(snapshot):
+    """Name, continent, country, region and municipality for every station in the data"""
+    codes = sorted(set(snapshot.counts(['origin']).index) | set(snapshot.counts(['destination']).index))
+    index = get_airport_index()
+    return {
+        "airports": [
+            index.get(code) or {"iata_code": code, **{field: None for field in FIELDS}}
+            for code in codes
+        ]
+    }
+
+
+def stations(snapshot, origin=None, destination=None, carrier=FOCUS_CARRIER):
+    """
+    Station dropdown lists from the route index: with an origin, the
+    destinations the carrier serves from it (and vice versa), otherwise every
+    origin and destination on its network
+    """
+    routes = snapshot.routes
+    if origin:
+        return {"origins": [origin], "destinations": routes.destinations(carrier, origin)}
+    if destination:
+        return {"origins": routes.origins(carrier, destination), "destinations": [destination]}
+    return {"origins": routes.origins(carrier), "destinations": routes.destinations(carrier)}
+
+
+def overview(snapshot, origin=None, destination=None, carrier=FOCUS_CARRIER, count=MOVEMENTS):
+    with span('overview.filter'):
+        # Filter for last month only, on the route's cells if a route filter is given
+        last_month = snapshot.kpis.latest_date - timedelta(days=30)
+        month = snapshot.cells(start=last_month, origin=origin, destination=destination, count=count)
+
+        # Filter for the carrier's flights only for metrics
+        cx_month = month[month['airline'] == carrier]
+
+    with span('overview.metrics'):
+        # Calculate metrics with filtered data
+        total_cx_flights = count_flights(cx_month)
+
+        if total_cx_flights > 0:
+            ontime_flights = count_flights(cx_month[cx_month['status_norm'] != 'Delayed'])
+            ontime_percentage = (ontime_flights / total_cx_flights * 100)
+
+            active_routes = len(routed(cx_month[['origin', 'destination']]).drop_duplicates())
+
+            cancelled_flights = count_flights(cx_month[cx_month['status_norm'] == 'Cancelled'])
+            cancellation_rate = (cancelled_flights / total_cx_flights * 100)
+        else:
+            ontime_percentage = 0
+            active_routes = 0
+            cancellation_rate = 0
+
+    metrics = {
+        "total_flights": total_cx_flights,
+        "ontime_performance": round(ontime_percentage, 1),
+        "active_routes": active_routes,
+        "cancellation_rate": round(cancellation_rate, 1)
+    }
+
+    with span('overview.weekly'):
+        # Weekly frequency
+        cx_weekly_counts = weekly_counts(cx_month)
+        all_weekly_counts = weekly_counts(month)
+
+        # weekly performance: cod (cancelled or delayed) flights
+        cx_weekly_cod_flights = weekly_counts(cx_month[cx_month['status_norm'].isin(COD_STATUSES)])
+        cx_cod_percentage = ((cx_weekly_cod_flights / cx_weekly_counts.replace(0, pd.NA)) * 100).fillna(0)
+
+        weekly_cod_flights = weekly_counts(month[month['status_norm'].isin(COD_STATUSES)])
+        all_cod_percentage = ((weekly_cod_flights/all_weekly_counts.replace(0, pd.NA))*100).fillna(0)
+
+    with span('overview.ranking'):
+        # Weekly top 10 by frequency, and the top 5 with their cancelled-or-delayed percentage
+        ranking = weekly_airline_ranking(month, top_n=10)
+        weeks = all_weekly_counts.index
+        weekly_top_10 = ranking_records(ranking, weeks, ['airline', 'flights'])
+        weekly_top_5 = ranking_records(ranking[ranking['rank'] <= 5], weeks, ['airline', 'flights', 'cod_percentage'])
+
+    # The CX_ series hold the carrier's figures, whichever carrier it is
+    return {
+        "carrier": carrier,
+        "count": count,
+        "metrics": metrics,
+        "dates": cx_weekly_counts.index.strftime('%Y-%m-%d').tolist(),
+        "CX_weekly_fq": cx_weekly_counts.tolist(),
+        "ALL_weekly_fq": all_weekly_counts.tolist(),
+        "CX_weekly_cod_percentage": cx_cod_percentage.tolist(),
+        "ALL_weekly_cod_percentage": all_cod_percentage.tolist(),
+        "weekly_top_10": weekly_top_10,
+        "weekly_top_5": weekly_top_5,
+        "stations": stations(snapshot, origin, destination, carrier)
+    }
+
+
+def resolve_windows(snapshot, window=DEFAULT_WINDOW, compare='previous'):
+    """The Window for a spec and its comparison baseline, against the snapshot's latest date"""
+    current = parse_window(window, snapshot.kpis.latest_date)
+    return current, baseline_window(current, compare)
+
+
+def describe_windows(current, baseline):
+    return {"current": current.to_dict(), "baseline": baseline.to_dict() if baseline is not None else None}
+
+
+def rounded(kpi):
+    """A {"value", "change"} KPI rounded for display (counts stay integers)"""
+    return {key: round(value, 1) for key, value in kpi.items()}
+
+
+def market_metrics(snapshot, window=DEFAULT_WINDOW, compare='previous', carrier=FOCUS_CARRIER, count=MOVEMENTS):
+    current, baseline = resolve_windows(snapshot, window, compare)
+    with span('market.kpis'):
+        kpis = snapshot.kpis.compare(current, baseline, carrier, count)
+
+    return {
+        "carrier": carrier,
+        "count": count,
+        "market_share": rounded(kpis["market_share"]),
+        "routes_served": rounded(kpis["routes_served"]),
+        "competitor_count": rounded(kpis["competitor_count"]),
+        # Growth of the whole market's (non-cancelled) flights against the baseline
+        "market_growth": {
+            "value": round(kpis["market_flights"].get("change", 0), 1)
+        },
+        "window": describe_windows(current, baseline),
+    }
+
+
+def performance(snapshot, window=DEFAULT_WINDOW, compare='previous', carrier=FOCUS_CARRIER, count=MOVEMENTS):
+    current, baseline = resolve_windows(snapshot, window, compare)
+    with span('performance.kpis'):
+        kpis = snapshot.kpis.compare(current, baseline, carrier, count)
+
+    with span('performance.schedule_changes'):
+        # Schedule Changes Analysis - Tracking Cancellations and Resumptions
+        # This needs individual flight numbers, so it reads the raw rows rather than the cube
+        days = (current.end - current.start).days
+        competitor_df = snapshot.flight_rows(
+            ['date', 'flight_no', 'airline', 'status'],
+            start=current.end - timedelta(days=days), end=current.end, exclude_airline=carrier, count=count,
+        )
+        changes = detect_schedule_changes(competitor_df, window=days, latest_date=current.end)
+
+    # Prepare the data for return
+    if not changes.empty:
+        schedule_data = [
+            [date, flight_no, airline, "Cancelled", f"Resumed on {resumed_on}"]
+            for date, flight_no, airline, resumed_on in zip(
+                changes['date'].dt.strftime('%Y-%m-%d'),
+                changes['flight_no'],
+                changes['airline'],
+                changes['resumed_on'].dt.strftime('%Y-%m-%d'),
+            )
+        ]
+    else:
+        schedule_data = ["None"]
+
+    return {
+        "carrier": carrier,
+        "count": count,
+        "metrics": {
+            "daily_flights": rounded(kpis["daily_flights"]),
+            "ontime_performance": rounded(kpis["ontime_performance"]),
+            "avg_delay": rounded(kpis["avg_delay"]),
+            "late_rate": rounded(kpis["late_rate"]),
+            "completion_factor": rounded(kpis["completion_factor"])
+        },
+        "schedule_changes": {
+            "columns": ["Date", "Flight No", "Airline", "Original Status", "New Status"],
+            "data": schedule_data
+        },
+        "window": describe_windows(current, baseline),
+    }
+
+
+def kpi_windows(snapshot, windows, compare='previous', carrier=FOCUS_CARRIER, count=MOVEMENTS):
+    """Every KPI for several window specs in one response, each against its own baseline"""
+    results = []
+    for window in windows:
+        current, baseline = resolve_windows(snapshot, window, compare)
+        with span('kpis.window', detail=window):
+            kpis = snapshot.kpis.compare(current, baseline, carrier, count)
+        results.append({
+            **describe_windows(current, baseline),
+            "kpis": {name: rounded(kpi) for name, kpi in kpis.items()},
+        })
+    return {
+        "carrier": carrier,
+        "count": count,
+        "latest_date": snapshot.kpis.latest_date.strftime('%Y-%m-%d'),
+        "windows": results,
+    }
+
+
+def carrier_kpis(snapshot, window=DEFAULT_WINDOW, compare='previous', carriers=None, count=MOVEMENTS):
+    """
+    Every KPI of several carriers (default: every carrier flying in the
+    window) for one window, busiest first. The per-carrier totals of the
+    window and its baseline come from one grouped pass each, shared with the
+    single-carrier endpoints through the snapshot's KpiEngine.
+    """
+    current, baseline = resolve_windows(snapshot, window, compare)
+    with span('carriers.grouped'):
+        grouped = snapshot.kpis.grouped_totals(current, count)
+        if baseline is not None:
+            snapshot.kpis.grouped_totals(baseline, count)
+    if carriers is None:
+        carriers = sorted(grouped["carriers"], key=lambda carrier: (-grouped["carriers"][carrier]["flights"], carrier))
+    with span('carriers.kpis'):
+        results = [
+            {"carrier": carrier, "kpis": {name: rounded(kpi) for name, kpi in snapshot.kpis.compare(current, baseline, carrier, count).items()}}
+            for carrier in carriers
+        ]
+    return {
+        "count": count,
+        "latest_date": snapshot.kpis.latest_date.strftime('%Y-%m-%d'),
+        "window": describe_windows(current, baseline),
+        "carriers": results,
+    }
+
+
+def detect_schedule_changes(df, window=30, latest_date=None):
+    """
+    Find cancelled flights and the date each flight number next appears.
+
+    Only rows dated within `window` days of latest_date (default: the latest
+    date in df) are considered. For every cancelled row, resumed_on is the
+    first later date on which the same flight_no occurs. Returns a DataFrame
+    with date, flight_no, airline and resumed_on, newest cancellations first.
+    """
+    rows = df[['date', 'flight_no', 'airline', 'status']]
+    rows = rows.assign(date=pd.to_datetime(rows['date']))
+    if latest_date is None:
+        latest_date = rows['date'].max()
+    rows = rows[rows['date'] >= latest_date - timedelta(days=window)]
+
+    # Next distinct date per flight number, in one pass over the sorted (flight_no, date) pairs
+    occurrences = rows[['flight_no', 'date']].drop_duplicates().sort_values(['flight_no', 'date'])
+    occurrences['resumed_on'] = occurrences.groupby('flight_no')['date'].shift(-1)
+
+    # Keep the legacy ordering: newest first, then flight numbers in order of first appearance
+    rows = rows.assign(flight_order=pd.factorize(rows['flight_no'])[0], row_order=range(len(rows)))
+    cancelled = rows[rows['status'] == 'Cancelled']
+    changes = cancelled.merge(occurrences, on=['flight_no', 'date'], how='inner')
+    changes = changes.dropna(subset=['resumed_on'])
+    changes = changes.sort_values(['date', 'flight_order', 'row_order'], ascending=[False, True, True], kind='stable')
+    return changes[['date', 'flight_no', 'airline', 'resumed_on']].reset_index(drop=True)
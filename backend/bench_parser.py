@@ -0,0 +1,146 @@
+"""
+Benchmark parse_hk_flights() against the per-flight dict parser it replaced.
+
+    python bench_parser.py [rows]
+
+Parses the pages recorded by test.py (hk_flights_raw.json) when present,
+otherwise synthetic pages of about `rows` flights (see synthetic_data) in
+which a share of the flights carry codeshare entries, as HKIA's do. Both
+parsers must return the same rows; the legacy one does not keep page order
+among flights scheduled at the same minute, so rows are compared sorted.
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from data_utils import get_airport_data, parse_hk_flights
+from stub_server import load_recorded_pages
+from synthetic_data import generate_flights, to_raw_pages
+
+RECORDED_PAGES = 'hk_flights_raw.json'
+DEFAULT_ROWS = 100_000
+REPEATS = 5
+# Share of synthetic flights with codeshare partners, and the most partners one has
+CODESHARE_SHARE = 0.3
+MAX_PARTNERS = 3
+
+
+def legacy_parse_hk_flights(data, flight_type, airport_data=None):
+    """The original parser, kept verbatim for comparison"""
+    if airport_data is None:
+        airport_data = {}
+    if not data or not data[0].get('list'):
+        return None
+
+    rows = []
+    for date_entry in data:
+        date = date_entry['date']
+        for flight in date_entry['list']:
+            flight_time = flight['time']
+            status = flight['status']
+
+            for f in flight['flight']:
+                flight_no = f['no']
+                airline = f['airline']
+
+                origin = 'HKG'
+                destination = 'HKG'
+                origin_name = airport_data.get('HKG', 'Hong Kong International Airport')
+                destination_name = airport_data.get('HKG', 'Hong Kong International Airport')
+
+                if flight_type == 'arrival':
+                    if flight['origin']:
+                        origin = flight['origin'][0]
+                        origin_name = airport_data.get(origin, f'Unknown ({origin})')
+                else:
+                    if 'destination' in flight and flight['destination']:
+                        destination = flight['destination'][0]
+                        destination_name = airport_data.get(destination, f'Unknown ({destination})')
+
+                row = {
+                    'date': date,
+                    'time': flight_time,
+                    'flight_no': flight_no,
+                    'airline': airline,
+                    'origin': origin,
+                    'destination': destination,
+                    'origin_name': origin_name,
+                    'destination_name': destination_name,
+                    'status': status,
+                    'flight_type': flight_type
+                }
+                rows.append(row)
+
+    if rows:
+        df = pd.DataFrame(rows)
+        df['datetime'] = pd.to_datetime(df['date'] + ' ' + df['time'])
+        df = df.sort_values('datetime', ascending=True)
+        df = df.reset_index(drop=True)
+
+        columns = ['date', 'time', 'flight_no', 'airline', 'origin', 'destination',
+                   'origin_name', 'destination_name', 'status', 'flight_type', 'datetime']
+        df = df[columns]
+        return df
+    return None
+
+
+def with_codeshares(pages, seed=0):
+    """Give CODESHARE_SHARE of the flights 1..MAX_PARTNERS codeshare entries of other airlines"""
+    rng = np.random.default_rng(seed)
+    airlines = sorted({entry['airline'] for page in pages.values() for date_entry in page
+                       for flight in date_entry['list'] for entry in flight['flight']})
+    for page in pages.values():
+        for date_entry in page:
+            for flight in date_entry['list']:
+                if rng.random() < CODESHARE_SHARE:
+                    for partner in rng.choice(airlines, size=rng.integers(1, MAX_PARTNERS + 1), replace=False):
+                        flight['flight'].append({'no': f'{partner[:2]} {rng.integers(1, 9999):04d}', 'airline': str(partner)})
+    return pages
+
+
+def parse_all(parser, pages, airport_data):
+    return [parser(page, flight_type, airport_data) for (_, flight_type), page in pages.items()]
+
+
+def main(rows):
+    if os.path.exists(RECORDED_PAGES):
+        pages = load_recorded_pages(RECORDED_PAGES)
+        print(f"{len(pages)} recorded pages from {RECORDED_PAGES}")
+    else:
+        pages = with_codeshares(to_raw_pages(generate_flights(rows)))
+        print(f"{len(pages)} synthetic pages, {CODESHARE_SHARE:.0%} of flights with codeshares")
+    airport_data = get_airport_data()
+
+    timings = {}
+    results = {}
+    for name, parser in (('legacy', legacy_parse_hk_flights), ('columnar', parse_hk_flights)):
+        seconds = []
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            results[name] = parse_all(parser, pages, airport_data)
+            seconds.append(time.perf_counter() - start)
+        timings[name] = float(np.median(seconds))
+
+    parsed_rows = 0
+    for legacy, columnar in zip(results['legacy'], results['columnar']):
+        if legacy is None or columnar is None:
+            if legacy is not columnar:
+                raise AssertionError("Parsers disagree on an empty page")
+            continue
+        parsed_rows += len(legacy)
+        # The legacy parser has no codeshare ranks; compare the columns it does have
+        columns = list(legacy.columns)
+        expected = legacy.sort_values(columns, kind='stable').reset_index(drop=True)
+        actual = columnar[columns].sort_values(columns, kind='stable').reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual, expected)
+
+    print(f"{parsed_rows} rows parsed identically\n")
+    print(f"{'parser':<10} {'median s':>9} {'rows/s':>12}")
+    for name, seconds in timings.items():
+        print(f"{name:<10} {seconds:>9.3f} {parsed_rows / seconds:>12,.0f}")
+    print(f"speedup: {timings['legacy'] / timings['columnar']:.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS)
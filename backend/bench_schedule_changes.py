@@ -0,0 +1,84 @@
+"""
+Benchmark detect_schedule_changes() against the per-flight iterrows() loop it replaced.
+
+    python bench_schedule_changes.py [scale ...]
+
+Each scale multiplies the stored competitor rows by cloning them under new
+flight numbers, so the number of distinct flights grows with the data.
+Both implementations must return the same rows in the same order.
+"""
+import sys
+import time
+from datetime import timedelta
+import pandas as pd
+from analytics import FOCUS_CARRIER, detect_schedule_changes
+from flight_storage import FlightStorage
+
+
+def legacy_schedule_changes(competitor_df, current_month_start):
+    """The original /performance loop, kept verbatim for comparison"""
+    competitor_df = competitor_df.assign(date=pd.to_datetime(competitor_df['date']))
+    competitor_df = competitor_df[competitor_df['date'] >= current_month_start]
+    schedule_changes = []
+    for flight_no in competitor_df['flight_no'].unique():
+        flight_data = competitor_df[competitor_df['flight_no'] == flight_no].sort_values('date')
+        for idx, row in flight_data.iterrows():
+            if row['status'] == 'Cancelled':
+                next_flights = flight_data[flight_data['date'] > row['date']]
+                if not next_flights.empty:
+                    next_scheduled = next_flights.iloc[0]
+                    schedule_changes.append([
+                        row['date'].strftime('%Y-%m-%d'),
+                        flight_no,
+                        row['airline'],
+                        next_scheduled['date'].strftime('%Y-%m-%d'),
+                    ])
+    schedule_changes.sort(key=lambda x: x[0], reverse=True)
+    return schedule_changes
+
+
+def vectorized_schedule_changes(competitor_df, latest_date):
+    changes = detect_schedule_changes(competitor_df, window=30, latest_date=latest_date)
+    return [
+        list(row) for row in zip(
+            changes['date'].dt.strftime('%Y-%m-%d'),
+            changes['flight_no'],
+            changes['airline'],
+            changes['resumed_on'].dt.strftime('%Y-%m-%d'),
+        )
+    ]
+
+
+def scaled(df, scale):
+    copies = [df.assign(flight_no=df['flight_no'] + f'/{i}') if i else df for i in range(scale)]
+    return pd.concat(copies, ignore_index=True)
+
+
+def main(scales):
+    flights = FlightStorage().load()
+    if flights.empty:
+        print("No stored flights to benchmark")
+        return
+    latest_date = pd.to_datetime(flights['date']).max()
+    competitors = flights[flights['airline'] != FOCUS_CARRIER]
+
+    print(f"{'rows':>10} {'flights':>8} {'changes':>8} {'legacy s':>10} {'vectorized s':>13} {'speedup':>8}")
+    for scale in scales:
+        df = scaled(competitors, scale)
+
+        start = time.perf_counter()
+        expected = legacy_schedule_changes(df, latest_date - timedelta(days=30))
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = vectorized_schedule_changes(df, latest_date)
+        vectorized_time = time.perf_counter() - start
+
+        if result != expected:
+            raise AssertionError(f"Results differ at scale {scale}")
+        print(f"{len(df):>10} {df['flight_no'].nunique():>8} {len(result):>8} "
+              f"{legacy_time:>10.3f} {vectorized_time:>13.4f} {legacy_time / vectorized_time:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1, 4])
@@ -0,0 +1,69 @@
+"""
+Compare the raw string flight table with the typed one from flight_schema.apply_schema().
+
+    python bench_schema.py [scale]
+
+Reports deep memory use per column and the time of the equality filters and
+groupbys the endpoints rely on. scale replicates the stored rows to model
+a longer history.
+"""
+import sys
+import time
+import pandas as pd
+from flight_schema import apply_schema, memory_report
+from flight_storage import FlightStorage
+
+REPEATS = 20
+
+
+def timed(func):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        func()
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+def operations(df, parse_dates):
+    def date_column():
+        return pd.to_datetime(df['date']) if parse_dates else df['date']
+
+    return {
+        "airline == 'CPA'": lambda: df[df['airline'] == 'CPA'],
+        "status != 'Cancelled'": lambda: df[df['status'] != 'Cancelled'],
+        "date >= last 30 days": lambda: df[date_column() >= date_column().max() - pd.Timedelta(days=30)],
+        "groupby airline size": lambda: df.groupby('airline', observed=True).size(),
+        "groupby date, flight_type": lambda: df.groupby([date_column(), 'flight_type'], observed=True).size(),
+    }
+
+
+def main(scale):
+    raw = FlightStorage().load()
+    if raw.empty:
+        print("No stored flights to benchmark")
+        return
+    raw = pd.concat([raw] * scale, ignore_index=True)
+
+    start = time.perf_counter()
+    typed = apply_schema(raw)
+    schema_time = time.perf_counter() - start
+
+    raw_memory = memory_report(raw)
+    typed_memory = memory_report(typed)
+    print(f"{len(raw)} rows, apply_schema took {schema_time * 1000:.1f} ms\n")
+    print(f"{'column':<20} {'raw KB':>10} {'typed KB':>10}")
+    for column in typed_memory:
+        raw_kb = f"{raw_memory[column] / 1024:.0f}" if column in raw_memory else '-'
+        print(f"{column:<20} {raw_kb:>10} {typed_memory[column] / 1024:>10.0f}")
+    print(f"reduction: {raw_memory['total'] / typed_memory['total']:.1f}x\n")
+
+    print(f"{'operation':<28} {'raw ms':>8} {'typed ms':>9} {'speedup':>8}")
+    raw_ops = operations(raw, parse_dates=True)
+    typed_ops = operations(typed, parse_dates=False)
+    for name in raw_ops:
+        raw_ms = timed(raw_ops[name])
+        typed_ms = timed(typed_ops[name])
+        print(f"{name:<28} {raw_ms:>8.2f} {typed_ms:>9.2f} {raw_ms / typed_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
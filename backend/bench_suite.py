@@ -0,0 +1,201 @@
+"""
+Benchmark the ingestion, storage and analytics pipeline on synthetic data.
+
+    python bench_suite.py [rows ...]                 run, default 10000 100000 1000000
+    python bench_suite.py compare old.json new.json  compare two saved runs
+
+For each size a synthetic dataset (see synthetic_data) is pushed through
+every step the server runs: parsing raw HKIA pages, writing and loading
+the partitioned store, typing, building the cube and snapshot indexes, and
+each endpoint function (computed and JSON-encoded, as on a cache miss).
+Each step reports latency percentiles, throughput and peak traced memory.
+Results are saved under bench_results/ as JSON named by time and commit.
+"""
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import analytics
+from aggregates import build_cube
+from data_utils import get_airport_data, parse_hk_flights
+from flight_schema import apply_schema
+from flight_storage import FlightStorage
+from flight_store import FlightSnapshot
+from response_encoding import dumps
+from synthetic_data import generate_flights, to_raw_pages
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_results')
+# Timed runs per pipeline step and per endpoint; large datasets get fewer
+STEP_REPEATS = 3
+ENDPOINT_REPEATS = 20
+LARGE_ROWS = 500_000
+# A step this much slower than in the baseline run is flagged by compare
+REGRESSION_RATIO = 1.2
+
+
+def measure(func, repeats, units=None, setup=None):
+    """
+    Time func() `repeats` times, then run it once more under tracemalloc for
+    its peak allocation. units is what throughput counts (rows), else calls.
+    setup(), if given, runs untimed before every call.
+    """
+    seconds = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    latencies = np.array(seconds) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    result = {
+        "runs": repeats,
+        "mean_ms": round(float(latencies.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "peak_mb": round(peak / 2 ** 20, 2),
+    }
+    if units is not None:
+        result["rows_per_s"] = round(units / float(np.median(seconds)))
+    else:
+        result["calls_per_s"] = round(1 / float(np.median(seconds)), 1)
+    return result
+
+
+def bench_size(rows, workdir):
+    large = rows >= LARGE_ROWS
+    step_repeats = 1 if large else STEP_REPEATS
+    endpoint_repeats = ENDPOINT_REPEATS // 4 if large else ENDPOINT_REPEATS
+    steps = {}
+
+    start = time.perf_counter()
+    raw = generate_flights(rows)
+    print(f"\n{len(raw)} rows over {raw['date'].nunique()} days (generated in {time.perf_counter() - start:.1f}s)")
+    pages = to_raw_pages(raw)
+    airport_data = get_airport_data()
+
+    def parse():
+        return pd.concat([parse_hk_flights(page, flight_type, airport_data)
+                          for (_, flight_type), page in pages.items()], ignore_index=True)
+
+    def write():
+        return FlightStorage(root=tempfile.mkdtemp(dir=workdir), legacy_file=None).write(raw)
+
+    storage = FlightStorage(root=os.path.join(workdir, 'store'), legacy_file=None)
+    storage.write(raw)
+    stored = storage.load()
+    flights = apply_schema(stored)
+    cube = build_cube(flights)
+
+    steps["ingest.parse_pages"] = measure(parse, step_repeats, len(raw))
+    steps["storage.write"] = measure(write, step_repeats, len(raw))
+    steps["storage.load"] = measure(storage.load, step_repeats, len(raw))
+    steps["schema.apply_schema"] = measure(lambda: apply_schema(stored), step_repeats, len(raw))
+    steps["aggregates.build_cube"] = measure(lambda: build_cube(flights), step_repeats, len(raw))
+    steps["store.snapshot_indexes"] = measure(lambda: FlightSnapshot(flights, cube, 1), step_repeats, len(raw))
+
+    snapshot = FlightSnapshot(flights, cube, 1)
+    cx_origins = snapshot.routes.origins(analytics.FOCUS_CARRIER)
+    busiest_origin = next((origin for origin in cx_origins if origin != 'HKG'), None)
+    endpoints = {
+        "hkia": lambda: analytics.hkia_summary(snapshot),
+        "overview": lambda: analytics.overview(snapshot),
+        "overview.origin": lambda: analytics.overview(snapshot, origin=busiest_origin),
+        "stations": lambda: analytics.stations(snapshot),
+        "market_metrics": lambda: analytics.market_metrics(snapshot),
+        "performance": lambda: analytics.performance(snapshot),
+        "kpis.7d_30d_90d": lambda: analytics.kpi_windows(snapshot, ['7d', '30d', '90d']),
+        "carriers": lambda: analytics.carrier_kpis(snapshot),
+        "airports": lambda: analytics.airport_directory(snapshot),
+    }
+    for name, compute in endpoints.items():
+        # Every repeat is a cold computation: the KPI engine's window memo is emptied first
+        steps[f"endpoint.{name}"] = measure(lambda: dumps(compute()), endpoint_repeats, setup=snapshot.kpis.clear_memo)
+
+    for name, result in steps.items():
+        throughput = f"{result['rows_per_s']:>11,} rows/s" if "rows_per_s" in result else f"{result['calls_per_s']:>10,} calls/s"
+        print(f"  {name:<28} p50 {result['p50_ms']:>10.2f} ms  p99 {result['p99_ms']:>10.2f} ms"
+              f"  {throughput}  peak {result['peak_mb']:>8.1f} MB")
+    return {"rows": len(raw), "days": int(raw['date'].nunique()), "steps": steps}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes):
+    meta = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+    results = {"meta": meta, "sizes": {}}
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    try:
+        for rows in sizes:
+            results["sizes"][str(rows)] = bench_size(rows, workdir)
+            for entry in os.listdir(workdir):
+                shutil.rmtree(os.path.join(workdir, entry))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    filename = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{meta['commit'] or 'nogit'}.json")
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
+    print(f"\nSaved {filename}")
+
+
+def compare(old_file, new_file):
+    """Print the p50 change of every step both runs measured; returns the number of regressions"""
+    with open(old_file, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_file, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    regressions = 0
+    for size, new_size in new["sizes"].items():
+        old_steps = old["sizes"].get(size, {}).get("steps", {})
+        print(f"\n{size} rows")
+        for name, result in new_size["steps"].items():
+            if name not in old_steps:
+                continue
+            before, after = old_steps[name]["p50_ms"], result["p50_ms"]
+            ratio = after / before if before > 0 else float('inf')
+            flag = '  REGRESSION' if ratio > REGRESSION_RATIO else ''
+            regressions += bool(flag)
+            print(f"  {name:<28} {before:>10.2f} -> {after:>10.2f} ms  {ratio:>5.2f}x{flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'compare':
+        sys.exit(1 if compare(sys.argv[2], sys.argv[3]) else 0)
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
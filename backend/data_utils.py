@@ -1,91 +1,105 @@
-import json
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-import requests
-import os
+from airport_index import get_airport_index
+from ingestion import IngestionEngine, FLIGHT_TYPES
+
+# The airport whose pages are parsed: the other end of every arrival and departure
+HUB = 'HKG'
+HUB_NAME = 'Hong Kong International Airport'
+EPOCH = datetime(1970, 1, 1)
+# Minutes after midnight of every 'HH:MM' time, so that scheduled times are parsed by lookup
+CLOCK_MINUTES = {f'{minute // 60:02d}:{minute % 60:02d}': minute for minute in range(24 * 60)}
 
 def get_airport_data():
-    """Load airport data from iata.json"""
-    try:
-        with open('iata.json', encoding='utf-8') as f:
-            airports = json.load(f)
-            return {airport['iata_code']: airport['name'] for airport in airports}
-    except FileNotFoundError:
-        print("Warning: iata.json not found")
-        return {}
+    """Airport code -> name lookup, served from the shared airport index"""
+    return get_airport_index().names()
 
-def get_hk_flights(date, flight_type='arrival', airport_data=None):
+def parse_hk_flights(data, flight_type, airport_data=None):
+    """
+    Parse one raw flightinfo-rest page into a flights DataFrame, or None if it is empty.
+
+    Every flight number of a flight becomes a row: the first one HKIA lists,
+    the operating carrier's, with codeshare 0 and the marketing numbers after
+    it with codeshare 1, 2, ... (see flight_storage.movements).
+
+    The page is walked once, appending into one buffer per column; scheduled
+    times become integer minutes (each distinct date parsed once with a
+    fixed format, times by table lookup) and each distinct station's name is
+    looked up once. Rows are sorted by datetime, keeping page order among
+    flights scheduled at the same minute, so a flight's numbers stay together.
+    """
+    if airport_data is None:
+        airport_data = {}
+    if not data or not data[0].get('list'):
+        return None
+
+    station_field = 'origin' if flight_type == 'arrival' else 'destination'
+    days = {}
+    dates, times, flight_nos, airlines, statuses, stations, minutes, ranks = [], [], [], [], [], [], [], []
+    for date_entry in data:
+        date = date_entry['date']
+        day = days.get(date)
+        if day is None:
+            day = days[date] = (datetime.strptime(date, '%Y-%m-%d') - EPOCH) // timedelta(minutes=1)
+        for flight in date_entry['list']:
+            codeshares = flight['flight']
+            count = len(codeshares)
+            flight_time = flight['time']
+            clock = CLOCK_MINUTES.get(flight_time)
+            if clock is None:
+                parsed = datetime.strptime(flight_time, '%H:%M')
+                clock = parsed.hour * 60 + parsed.minute
+            listed = flight.get(station_field)
+            dates += [date] * count
+            times += [flight_time] * count
+            minutes += [day + clock] * count
+            statuses += [flight['status']] * count
+            # A flight that lists no station is shown at the hub
+            stations += [listed[0] if listed else HUB] * count
+            ranks += range(count)
+            for codeshare in codeshares:
+                flight_nos.append(codeshare['no'])
+                airlines.append(codeshare['airline'])
+    if not flight_nos:
+        return None
+
+    hub_name = airport_data.get(HUB, HUB_NAME)
+    names = {code: airport_data.get(code, f'Unknown ({code})') for code in set(stations)}
+    names[HUB] = hub_name
+    station_names = [names[code] for code in stations]
+    hub = [HUB] * len(stations)
+    hub_names = [hub_name] * len(stations)
+    arrival = flight_type == 'arrival'
+    df = pd.DataFrame({
+        'date': dates,
+        'time': times,
+        'flight_no': flight_nos,
+        'airline': airlines,
+        'origin': stations if arrival else hub,
+        'destination': hub if arrival else stations,
+        'origin_name': station_names if arrival else hub_names,
+        'destination_name': hub_names if arrival else station_names,
+        'status': statuses,
+        'flight_type': [flight_type] * len(stations),
+        'datetime': np.array(minutes, dtype='datetime64[m]').astype('datetime64[ns]'),
+        'codeshare': np.array(ranks, dtype='int8'),
+    })
+    scheduled = np.array(minutes)
+    if (scheduled[1:] < scheduled[:-1]).any():
+        df = df.iloc[np.argsort(scheduled, kind='stable')].reset_index(drop=True)
+    return df
+
+def get_hk_flights(date, flight_type='arrival', airport_data=None, engine=None):
     """
     Get flights data for a specific date and type (arrival/departure)
     """
-    if flight_type not in ['arrival', 'departure']:
+    if flight_type not in FLIGHT_TYPES:
         raise ValueError("flight_type must be either 'arrival' or 'departure'")
     
-    is_arrival = 'true' if flight_type == 'arrival' else 'false'
-    api_url = f'https://www.hongkongairport.com/flightinfo-rest/rest/flights/past?date={date}&lang=en&cargo=true&arrival={is_arrival}'
-    
-    try:
-        response = requests.get(api_url)
-        
-        if response.status_code == 200:
-            data = response.json()
-            rows = []
-            
-            if not data or not data[0].get('list'):
-                return None
-            
-            for date_entry in data:
-                date = date_entry['date']
-                for flight in date_entry['list']:
-                    flight_time = flight['time']
-                    status = flight['status']
-                    
-                    for f in flight['flight']:
-                        flight_no = f['no']
-                        airline = f['airline']
-                        
-                        origin = 'HKG'
-                        destination = 'HKG'
-                        origin_name = airport_data.get('HKG', 'Hong Kong International Airport')
-                        destination_name = airport_data.get('HKG', 'Hong Kong International Airport')
-                        
-                        if flight_type == 'arrival':
-                            if flight['origin']:
-                                origin = flight['origin'][0]
-                                origin_name = airport_data.get(origin, f'Unknown ({origin})')
-                        else:
-                            if 'destination' in flight and flight['destination']:
-                                destination = flight['destination'][0]
-                                destination_name = airport_data.get(destination, f'Unknown ({destination})')
-                        
-                        row = {
-                            'date': date,
-                            'time': flight_time,
-                            'flight_no': flight_no,
-                            'airline': airline,
-                            'origin': origin,
-                            'destination': destination,
-                            'origin_name': origin_name,
-                            'destination_name': destination_name,
-                            'status': status,
-                            'flight_type': flight_type
-                        }
-                        rows.append(row)
-            
-            if rows:
-                df = pd.DataFrame(rows)
-                df['datetime'] = pd.to_datetime(df['date'] + ' ' + df['time'])
-                df = df.sort_values('datetime', ascending=True)
-                df = df.reset_index(drop=True)
-                
-                columns = ['date', 'time', 'flight_no', 'airline', 'origin', 'destination', 
-                          'origin_name', 'destination_name', 'status', 'flight_type', 'datetime']
-                df = df[columns]
-                return df
-            return None
-        else:
-            print(f"Failed to retrieve {flight_type} data for {date}. Status code: {response.status_code}")
-            return None
-    except Exception as e:
-        print(f"Error retrieving data for {date}: {str(e)}")
-        return None
\ No newline at end of file
+    if engine is None:
+        with IngestionEngine(max_workers=1) as engine:
+            data = engine.fetch_page(date, flight_type)
+    else:
+        data = engine.fetch_page(date, flight_type)
+    return parse_hk_flights(data, flight_type, airport_data)
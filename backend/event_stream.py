@@ -0,0 +1,189 @@
+"""
+Server-sent events pushing dashboard updates to the open dashboards (/events).
+
+Each time the store publishes a new snapshot, the broadcaster works out once
+what changed on the dashboards' default views since the previous snapshot
+and sends it to every subscriber as one `update` event:
+
+    id: 12
+    event: update
+    data: {"version": 12, "latest_date": "2024-11-07",
+           "days": {"2024-11-07": {"arrival": 212, "departure": 230}},
+           "patches": {"overview": {...}, "market-metrics": {...}, "performance": {...}},
+           "schedule_changes": {"removed": [4, 5], "added": [[0, [...]]]}}
+
+days holds the movement counts of the days that are new or changed. patches
+holds a JSON merge patch (RFC 7386) per endpoint: applied to the payload the
+client fetched, it gives the new payload. The performance patch leaves out
+the schedule-change table; schedule_changes has the indices of the rows that
+left it and the rows that appeared in it, each with its index in the new
+table. Event ids are snapshot versions. A client that reconnects with a
+Last-Event-ID still in the buffer gets the events it missed. One that missed
+more than that, or whose queue filled up, gets a `reset` event and refetches
+instead.
+"""
+import asyncio
+from collections import deque
+from difflib import SequenceMatcher
+import json
+import threading
+import analytics
+from aggregates import MOVEMENTS
+from response_encoding import dumps
+
+# The views whose changes are pushed: the endpoints the dashboard pages load, with their default parameters
+VIEWS = {
+    'overview': analytics.overview,
+    'market-metrics': analytics.market_metrics,
+    'performance': analytics.performance,
+}
+# Published versions remembered for clients reconnecting with a Last-Event-ID
+EVENT_HISTORY = 32
+# Events a subscriber may have queued before it is sent a reset instead
+QUEUE_SIZE = 16
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 15
+KEEP_ALIVE = b': keep-alive\n\n'
+
+
+def merge_patch(old, new):
+    """The JSON merge patch (RFC 7386) that turns old into new"""
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+    patch = {key: None for key in old if key not in new}
+    for key, value in new.items():
+        if key not in old or old[key] != value:
+            patch[key] = merge_patch(old.get(key), value)
+    return patch
+
+
+def format_event(event, version, data):
+    return f'id: {version}\nevent: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode('utf-8')
+
+
+def dashboard_state(snapshot):
+    """The default view payloads and per-day counts an update is diffed from, as plain JSON values"""
+    days = {}
+    for (date, flight_type), flights in snapshot.counts(['date', 'flight_type'], MOVEMENTS).items():
+        days.setdefault(date.strftime('%Y-%m-%d'), {})[flight_type] = int(flights)
+    return {
+        "latest_date": snapshot.kpis.latest_date.strftime('%Y-%m-%d'),
+        "days": days,
+        "views": {endpoint: json.loads(dumps(view(snapshot))) for endpoint, view in VIEWS.items()},
+    }
+
+
+def schedule_rows(performance):
+    rows = performance["schedule_changes"]["data"]
+    # The table holds ["None"] when nothing was cancelled and resumed
+    return [] if rows == ["None"] else rows
+
+
+def row_changes(old_rows, new_rows):
+    """
+    Schedule-change table edits: dropping the rows at the removed indices of
+    old_rows and then inserting each added row at its index, in order, gives
+    new_rows.
+    """
+    matcher = SequenceMatcher(None, [tuple(row) for row in old_rows], [tuple(row) for row in new_rows], autojunk=False)
+    removed, added = [], []
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag != 'equal':
+            removed += range(old_start, old_end)
+            added += [[index, new_rows[index]] for index in range(new_start, new_end)]
+    return {"removed": removed, "added": added}
+
+
+def dashboard_update(old, new):
+    """The update event's data for a move from state old to state new, or None if nothing visible changed"""
+    views = {endpoint: dict(view) for endpoint, view in new["views"].items()}
+    old_rows, new_rows = schedule_rows(old["views"]["performance"]), schedule_rows(views["performance"])
+    old_views = {**old["views"], "performance": {**old["views"]["performance"], "schedule_changes": None}}
+    views["performance"]["schedule_changes"] = None
+    update = {
+        "latest_date": new["latest_date"],
+        "days": {date: counts for date, counts in new["days"].items() if old["days"].get(date) != counts},
+        "patches": {endpoint: merge_patch(old_views[endpoint], view) for endpoint, view in views.items()},
+        "schedule_changes": row_changes(old_rows, new_rows),
+    }
+    changed = update["days"] or any(update["patches"].values()) or any(update["schedule_changes"].values())
+    return update if changed or new["latest_date"] != old["latest_date"] else None
+
+
+class UpdateBroadcaster:
+    """
+    Computes each snapshot's dashboard update once (publish(), a FlightStore
+    listener, runs on the refreshing thread) and fans it out to the /events
+    streams, each of which reads its own asyncio queue on the event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._state = None
+        self._version = 0
+        # (version, encoded update event or None when that version changed nothing visible)
+        self._history = deque(maxlen=EVENT_HISTORY)
+
+    def publish(self, snapshot):
+        if snapshot.empty:
+            return
+        state = dashboard_state(snapshot)
+        if self._state is None:
+            # Nothing to diff against: whoever connected before the first load refetches
+            event = format_event('reset', snapshot.version, {"version": snapshot.version})
+        else:
+            update = dashboard_update(self._state, state)
+            event = format_event('update', snapshot.version, {"version": snapshot.version, **update}) if update else None
+        with self._lock:
+            self._state = state
+            self._version = snapshot.version
+            self._history.append((snapshot.version, event))
+            subscribers = list(self._subscribers)
+        if event is not None:
+            for loop, queue in subscribers:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _deliver(self, queue, event):
+        if queue.full():
+            # Too far behind to catch up event by event
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(format_event('reset', self._version, {"version": self._version}))
+            return
+        queue.put_nowait(event)
+
+    def _backlog(self, last_event_id):
+        """What a new stream starts with: a ready event, the missed updates, or a reset"""
+        if last_event_id is None:
+            return [format_event('ready', self._version, {"version": self._version})]
+        try:
+            last = int(last_event_id)
+        except ValueError:
+            last = -1
+        if last == self._version:
+            return []
+        if self._history and self._history[0][0] - 1 <= last < self._version:
+            return [event for version, event in self._history if version > last and event is not None]
+        return [format_event('reset', self._version, {"version": self._version})]
+
+    async def stream(self, last_event_id=None):
+        """The byte chunks of one subscriber's text/event-stream, until the client goes away"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.add(subscriber)
+            backlog = self._backlog(last_event_id)
+        try:
+            for event in backlog:
+                yield event
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber[1].get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield KEEP_ALIVE
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
@@ -0,0 +1,346 @@
+"""
+Optional SQLite backend for the flight store (CARGOPRISM_BACKEND=sqlite).
+
+The typed flight table is mirrored from the partition files (see
+flight_storage) into flights_db/flights.sqlite, indexed on date, airline,
+route and flight number. The endpoint metrics run as SQL aggregates against
+it and only their grouped results are read into pandas, so the server's
+memory use stays flat however long the history grows. SqliteSnapshot offers
+the query methods of flight_store.FlightSnapshot, the in-memory backend.
+"""
+import os
+import sqlite3
+import threading
+import pandas as pd
+from aggregates import CUBE_KEYS, MOVEMENTS
+from data_utils import HUB
+from flight_export import CHUNK_ROWS, EXPORT_COLUMNS
+from flight_schema import STATUS_NORMS, apply_schema
+from flight_storage import read_flights_csv
+from instrumentation import span
+from kpi_engine import DAILY_MEASURES, KpiEngine
+from status_parser import ONTIME_THRESHOLD_MINUTES
+
+DB_FILE = 'flights.sqlite'
+# Seconds a connection waits for another process's write to finish
+BUSY_TIMEOUT = 30
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS flights (
+    date TEXT NOT NULL,
+    time TEXT,
+    flight_no TEXT,
+    airline TEXT,
+    origin TEXT,
+    destination TEXT,
+    origin_name TEXT,
+    destination_name TEXT,
+    status TEXT,
+    flight_type TEXT NOT NULL,
+    datetime TEXT,
+    codeshare INTEGER NOT NULL DEFAULT 0,
+    status_category TEXT,
+    actual_datetime TEXT,
+    delay_minutes REAL,
+    status_norm TEXT,
+    seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS flights_date ON flights (date, flight_type);
+CREATE INDEX IF NOT EXISTS flights_airline ON flights (airline, date);
+CREATE INDEX IF NOT EXISTS flights_route ON flights (origin, destination, date);
+CREATE INDEX IF NOT EXISTS flights_flight_no ON flights (flight_no, date);
+CREATE TABLE IF NOT EXISTS partitions (
+    date TEXT NOT NULL,
+    flight_type TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (date, flight_type)
+);
+"""
+# seq is the row's position in its partition file, so that ROW_ORDER is the order FlightStorage.load() returns
+ROW_COLUMNS = EXPORT_COLUMNS + ['status_norm', 'seq']
+ROW_ORDER = 'datetime, date, flight_type, seq'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# The cube keys as SQL; the cube's codeshare is a flag, telling marketing flight numbers from operating ones
+CELL_KEYS = ', '.join('codeshare > 0' if key == 'codeshare' else key for key in CUBE_KEYS)
+CELL_COLUMNS = ', '.join('codeshare > 0 AS codeshare' if key == 'codeshare' else key for key in CUBE_KEYS)
+# The cube's measures (see aggregates.build_cube) as SQL aggregates; max() of a NULL delay is NULL, which sum() skips
+CELL_MEASURES = ("count(*) AS flights, count(delay_minutes) AS timed, "
+                 "CAST(round(coalesce(sum(max(delay_minutes, 0)), 0)) AS INTEGER) AS delay_minutes, "
+                 f"count(CASE WHEN delay_minutes > {ONTIME_THRESHOLD_MINUTES} THEN 1 END) AS late")
+# Bumped whenever the columns derived from the status (see status_parser) change, so mirrors reload
+DERIVED_VERSION = 1
+
+
+def _day(value):
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+
+def _where(start=None, end=None, exclude_airline=None, count=None, routed=False, **equal):
+    """
+    SQL WHERE clause and its parameters for a date range, operating flight
+    numbers only when counting movements, routed rows only (see
+    aggregates.routed) if asked, and column == value filters (unset ones
+    skipped)
+    """
+    clauses, params = [], []
+    if routed:
+        clauses.append('NOT (origin = ? AND destination = ?)')
+        params += [HUB, HUB]
+    if count == MOVEMENTS:
+        clauses.append('codeshare = 0')
+    if start is not None:
+        clauses.append('date >= ?')
+        params.append(_day(start))
+    if end is not None:
+        clauses.append('date <= ?')
+        params.append(_day(end))
+    if exclude_airline is not None:
+        clauses.append('airline IS NOT ?')
+        params.append(exclude_airline)
+    for column, value in equal.items():
+        if value:
+            clauses.append(f'{column} = ?')
+            params.append(value)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def _typed(frame):
+    """Parse the text date columns of a query result back into datetime64"""
+    for column in ('date', 'datetime', 'actual_datetime'):
+        if column in frame.columns:
+            frame[column] = pd.to_datetime(frame[column], format='%Y-%m-%d' if column == 'date' else TIMESTAMP_FORMAT)
+    return frame
+
+
+def _has_codeshare(connection):
+    return any(row[1] == 'codeshare' for row in connection.execute('PRAGMA table_info(flights)'))
+
+
+def _current(connection):
+    """
+    False for a database written before the flights table had its codeshare
+    column, or with status-derived columns from an older DERIVED_VERSION
+    """
+    return _has_codeshare(connection) and connection.execute('PRAGMA user_version').fetchone()[0] >= DERIVED_VERSION
+
+
+def _migrate(connection):
+    if not _has_codeshare(connection):
+        connection.execute('ALTER TABLE flights ADD COLUMN codeshare INTEGER NOT NULL DEFAULT 0')
+    # Forget the mirrored partitions too, so that the next mirror() reloads them with codeshare ranks and fresh derived columns
+    connection.execute('DELETE FROM partitions')
+    connection.execute(f'PRAGMA user_version = {DERIVED_VERSION}')
+
+
+class FlightDatabase:
+    """
+    The flight table in a SQLite file, mirrored from the partition files.
+    Each thread gets its own connection; the file is in WAL mode, so queries
+    do not wait for a mirror being written by this or another process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # Autocommit; mirror() manages its own transaction
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(SCHEMA)
+        if not _current(connection):
+            # Under the write lock, so that processes starting together migrate the file once
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                if not _current(connection):
+                    _migrate(connection)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        return connection
+
+    def connection(self):
+        """This thread's connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self.connect()
+        return connection
+
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.connection(), params=params)
+
+    def scalar(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchone()[0]
+
+    def mirror(self, storage):
+        """
+        Bring the database in line with storage's partition files: load the
+        partitions that are new or changed (by mtime and size) since they were
+        mirrored and drop the ones that are gone, in one transaction. Returns
+        the (date, flight_type) partitions it touched.
+        """
+        connection = self.connection()
+        with span('database.mirror'):
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                mirrored = {
+                    (date, flight_type): (mtime_ns, size)
+                    for date, flight_type, mtime_ns, size in connection.execute('SELECT * FROM partitions')
+                }
+                stored = {}
+                for date, flight_type in storage.partitions():
+                    stat = os.stat(storage.partition_path(date, flight_type))
+                    stored[(date, flight_type)] = (stat.st_mtime_ns, stat.st_size)
+                removed = [key for key in mirrored if key not in stored]
+                changed = [key for key, state in stored.items() if mirrored.get(key) != state]
+                for key in removed:
+                    connection.execute('DELETE FROM flights WHERE date = ? AND flight_type = ?', key)
+                    connection.execute('DELETE FROM partitions WHERE date = ? AND flight_type = ?', key)
+                for key in changed:
+                    self._load_partition(connection, storage.partition_path(*key), key, stored[key])
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        return sorted(removed + changed)
+
+    def _load_partition(self, connection, path, key, state):
+        flights = apply_schema(read_flights_csv(path))
+        rows = pd.DataFrame({
+            **{column: flights[column].astype(object) for column in EXPORT_COLUMNS},
+            'date': flights['date'].dt.strftime('%Y-%m-%d'),
+            'datetime': flights['datetime'].dt.strftime(TIMESTAMP_FORMAT),
+            'actual_datetime': flights['actual_datetime'].dt.strftime(TIMESTAMP_FORMAT),
+            'status_norm': pd.Categorical.from_codes(flights['status_code'], STATUS_NORMS).astype(object),
+            'seq': range(len(flights)),
+        }, columns=ROW_COLUMNS)
+        rows = rows.astype(object).where(rows.notna(), None)
+        connection.execute('DELETE FROM flights WHERE date = ? AND flight_type = ?', key)
+        connection.executemany(
+            f"INSERT INTO flights ({', '.join(ROW_COLUMNS)}) VALUES ({', '.join('?' * len(ROW_COLUMNS))})",
+            rows.itertuples(index=False, name=None),
+        )
+        connection.execute('INSERT OR REPLACE INTO partitions VALUES (?, ?, ?, ?)', (*key, *state))
+
+
+class SqliteRoutes:
+    """The station lookups of route_index.RouteIndex, as DISTINCT queries"""
+
+    def __init__(self, database):
+        self.database = database
+
+    def _stations(self, column, airline, other, value):
+        where, params = _where(airline=airline, routed=True, **{other: value})
+        sql = f'SELECT DISTINCT {column} FROM flights{where} ORDER BY {column}'
+        return [row[0] for row in self.database.connection().execute(sql, params) if row[0] is not None]
+
+    def destinations(self, airline, origin=None):
+        """Sorted destinations the airline flies to, from origin if given"""
+        return self._stations('destination', airline, 'origin', origin)
+
+    def origins(self, airline, destination=None):
+        """Sorted origins the airline flies from, to destination if given"""
+        return self._stations('origin', airline, 'destination', destination)
+
+
+class SqliteKpis(KpiEngine):
+    """The windowed KPIs of KpiEngine, with each window's per-carrier totals counted by SQL GROUP BYs"""
+
+    def __init__(self, database, latest_date):
+        self._grouped = {}
+        self.database = database
+        self.latest_date = latest_date
+
+    def _group(self, window, count):
+        where, params = _where(window.start, window.end, count=count)
+        connection = self.database.connection()
+        rows = connection.execute(f"""
+            SELECT airline, count(*), count(CASE WHEN status_norm = 'Cancelled' THEN 1 END),
+                   count(CASE WHEN status_norm = 'Delayed' THEN 1 END), count(delay_minutes),
+                   CAST(round(coalesce(sum(max(delay_minutes, 0)), 0)) AS INTEGER),
+                   count(CASE WHEN delay_minutes > {ONTIME_THRESHOLD_MINUTES} THEN 1 END)
+            FROM flights{where} GROUP BY airline
+        """, params).fetchall()
+        routes_where, routes_params = _where(window.start, window.end, count=count, routed=True)
+        routes = dict(connection.execute(
+            f'SELECT airline, count(*) FROM (SELECT DISTINCT airline, origin, destination FROM flights{routes_where}) GROUP BY airline',
+            routes_params,
+        ).fetchall())
+        carriers = {
+            airline: {**dict(zip(DAILY_MEASURES, counts)), 'routes': routes.get(airline, 0)}
+            for airline, *counts in rows if airline is not None
+        }
+        return {
+            "carriers": carriers,
+            "market_flights": sum(row[1] - row[2] for row in rows),
+            "airlines": len(carriers),
+        }
+
+
+class SqliteSnapshot:
+    """
+    A version of the flight table held in a FlightDatabase, queried on
+    demand through the FlightSnapshot query methods. Every query reads the
+    database as of its own start, so a mirror committed while a request is
+    being answered can show in that request's later queries; the snapshot
+    the store publishes next makes the response cache drop such answers.
+    """
+
+    def __init__(self, database, version):
+        self.database = database
+        self.version = version
+        self.flight_count = database.scalar('SELECT count(*) FROM flights')
+        latest_date = database.scalar('SELECT max(date) FROM flights')
+        self.routes = SqliteRoutes(database)
+        self.kpis = SqliteKpis(database, pd.Timestamp(latest_date) if latest_date is not None else None)
+
+    @property
+    def empty(self):
+        return self.flight_count == 0
+
+    def counts(self, keys, count=MOVEMENTS):
+        """Flights per combination of the given cube keys, as a Series indexed by them"""
+        columns = ', '.join(keys)
+        where, params = _where(count=count)
+        frame = _typed(self.database.query(
+            f'SELECT {columns}, count(*) AS flights FROM flights{where} GROUP BY {columns} ORDER BY {columns}', params
+        ))
+        return frame.set_index(keys)['flights']
+
+    def cells(self, start=None, end=None, origin=None, destination=None, count=MOVEMENTS):
+        """Cube cells (see aggregates.build_cube) for an origin, destination or route, dated start..end"""
+        where, params = _where(start, end, count=count, origin=origin, destination=destination)
+        cells = _typed(self.database.query(
+            f'SELECT {CELL_COLUMNS}, {CELL_MEASURES} FROM flights{where} GROUP BY {CELL_KEYS} ORDER BY {CELL_KEYS}', params
+        ))
+        return cells.assign(codeshare=cells['codeshare'].astype(bool))
+
+    def flight_rows(self, columns, start=None, end=None, exclude_airline=None, count=MOVEMENTS):
+        """Flight rows dated start..end, optionally leaving one airline out, in stored order"""
+        where, params = _where(start, end, exclude_airline, count)
+        return _typed(self.database.query(f"SELECT {', '.join(columns)} FROM flights{where} ORDER BY {ROW_ORDER}", params))
+
+    def export(self, offset=0, limit=None, start_date=None, end_date=None, **filters):
+        """
+        (number of matching flights, generator of export frames for the flights
+        offset..offset + limit), read chunk by chunk off one cursor
+        """
+        where, params = _where(start_date, end_date, **filters)
+        total = self.database.scalar(f'SELECT count(*) FROM flights{where}', params)
+        sql = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM flights{where} ORDER BY {ROW_ORDER} LIMIT ? OFFSET ?"
+        return total, self._export_frames(sql, params + [-1 if limit is None else limit, offset])
+
+    def _export_frames(self, sql, params):
+        # A connection of its own: a streamed response pulls chunks from whichever thread is free
+        connection = self.database.connect()
+        try:
+            cursor = connection.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(CHUNK_ROWS)
+                if not rows:
+                    break
+                yield _typed(pd.DataFrame(rows, columns=EXPORT_COLUMNS))
+        finally:
+            connection.close()
@@ -0,0 +1,85 @@
+import io
+import numpy as np
+import pandas as pd
+from flight_storage import COLUMNS
+
+# Optional: Arrow IPC exports need pyarrow
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+EXPORT_COLUMNS = COLUMNS + ['status_category', 'actual_datetime', 'delay_minutes']
+TIMESTAMP_COLUMNS = ['date', 'datetime', 'actual_datetime']
+EXPORT_FORMATS = ('ndjson', 'arrow')
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'arrow': 'application/vnd.apache.arrow.stream'}
+# Rows encoded per streamed chunk
+CHUNK_ROWS = 5000
+
+
+def select_rows(flights, start_date=None, end_date=None, flight_type=None, airline=None, origin=None, destination=None):
+    """
+    Positions of the flights matching the filters, in datetime order. The
+    table is sorted by datetime, so the date range is a binary search and the
+    remaining equality filters only scan the rows inside it.
+    """
+    dates = flights['date'].to_numpy()
+    lo = np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date)), side='left') if start_date else 0
+    hi = np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date)), side='right') if end_date else len(dates)
+    positions = np.arange(lo, max(lo, hi))
+    for column, value in (('flight_type', flight_type), ('airline', airline), ('origin', origin), ('destination', destination)):
+        if value:
+            positions = positions[flights[column].to_numpy()[positions] == value]
+    return positions
+
+
+def export_frame(flights, positions):
+    """The exported columns for some rows, categoricals as plain strings"""
+    frame = flights.iloc[positions][EXPORT_COLUMNS]
+    return frame.assign(**{
+        column: frame[column].astype(object)
+        for column in EXPORT_COLUMNS if isinstance(frame[column].dtype, pd.CategoricalDtype)
+    })
+
+
+def frames(flights, positions, chunk_rows=CHUNK_ROWS):
+    """Yield the export frames of the rows at positions, chunk_rows at a time"""
+    for start in range(0, len(positions), chunk_rows):
+        yield export_frame(flights, positions[start:start + chunk_rows])
+
+
+def ndjson_chunks(frames):
+    """Yield export frames as newline-delimited JSON, one encoded chunk per frame"""
+    for frame in frames:
+        frame = frame.assign(
+            date=frame['date'].dt.strftime('%Y-%m-%d'),
+            datetime=frame['datetime'].dt.strftime('%Y-%m-%d %H:%M:%S'),
+            actual_datetime=frame['actual_datetime'].dt.strftime('%Y-%m-%d %H:%M:%S'),
+        )
+        # pandas' C encoder writes NaN as null; it escapes '/' as '\/', which is still valid JSON
+        text = frame.to_json(orient='records', lines=True)
+        yield (text if text.endswith('\n') else text + '\n').encode('utf-8')
+
+
+def arrow_chunks(frames):
+    """Yield export frames as an Arrow IPC stream, one record batch per frame"""
+    sink = io.BytesIO()
+    schema = pa.schema([
+        (column, pa.timestamp('ns') if column in TIMESTAMP_COLUMNS
+         else pa.float32() if column == 'delay_minutes' else pa.int8() if column == 'codeshare' else pa.string())
+        for column in EXPORT_COLUMNS
+    ])
+    writer = pa.ipc.new_stream(sink, schema)
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    yield drain()
+    for frame in frames:
+        writer.write_batch(pa.RecordBatch.from_pandas(frame, schema=schema, preserve_index=False))
+        yield drain()
+    writer.close()
+    yield drain()
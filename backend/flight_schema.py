@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+from instrumentation import span
+from status_parser import parse_statuses
+
+# Low-cardinality text columns held as pandas categoricals in memory
+CATEGORY_COLUMNS = ['airline', 'origin', 'destination', 'origin_name', 'destination_name', 'status', 'flight_type']
+# Normalized status, indexed by status_code
+STATUS_NORMS = ['Other', 'Cancelled', 'Delayed']
+
+
+def status_codes(status):
+    """
+    Integer-coded normalized status: 0 other, 1 cancelled, 2 delayed, as HKIA
+    labels the flight. How late flights ran by their actual times is counted
+    separately (see aggregates.build_cube's late).
+    """
+    return pd.Series(
+        np.select([status == 'Cancelled', status == 'Delayed'], [1, 2], default=0).astype('int8'),
+        index=status.index,
+    )
+
+
+def apply_schema(df):
+    """
+    Return the flight table with enforced in-memory types: categoricals for
+    the text columns above, datetime64 date and datetime, the parsed status
+    columns (status_category, actual_datetime, delay_minutes, see
+    status_parser) and an int8 status_code. Safe to call again on an already
+    typed (or concatenated) table; the status is only parsed for new tables.
+    """
+    if df.empty and not len(df.columns):
+        return df
+    typed = {
+        column: df[column] if isinstance(df[column].dtype, pd.CategoricalDtype) else df[column].astype('category')
+        for column in CATEGORY_COLUMNS
+    }
+    with span('schema.to_datetime'):
+        typed['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+        typed['datetime'] = pd.to_datetime(df['datetime'])
+    df = df.assign(**typed)
+    if 'delay_minutes' not in df.columns:
+        with span('schema.parse_statuses'):
+            df = pd.concat([df, parse_statuses(df['status'], df['datetime'])], axis=1)
+    elif not isinstance(df['status_category'].dtype, pd.CategoricalDtype):
+        df['status_category'] = df['status_category'].astype('category')
+    df['status_code'] = status_codes(df['status'])
+    return df
+
+
+def memory_report(df):
+    """Deep memory use per column in bytes, plus the total"""
+    usage = df.memory_usage(deep=True, index=False)
+    report = {column: int(size) for column, size in usage.items()}
+    report['total'] = int(usage.sum())
+    return report
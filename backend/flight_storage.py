@@ -0,0 +1,166 @@
+import os
+import numpy as np
+import pandas as pd
+from instrumentation import span
+
+COLUMNS = ['date', 'time', 'flight_no', 'airline', 'origin', 'destination',
+           'origin_name', 'destination_name', 'status', 'flight_type', 'datetime', 'codeshare']
+KEY_COLUMNS = ['date', 'time', 'flight_no', 'flight_type']
+# A physical movement, named by its operating flight number (see movements())
+MOVEMENT_COLUMNS = ['date', 'time', 'flight_type', 'operating_no']
+
+
+def read_flights_csv(filename):
+    """
+    Read a flights CSV keeping codes such as 'NAN' and empty statuses as
+    strings. Files written before codeshares were tracked count every row as
+    a movement of its own.
+    """
+    df = pd.read_csv(filename, dtype=str, keep_default_na=False)
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    df['codeshare'] = df['codeshare'].astype('int8') if 'codeshare' in df.columns else pd.Series(0, index=df.index, dtype='int8')
+    return df
+
+
+def movements(df):
+    """
+    Number the physical movement of every row. A movement's rows are stored
+    together: its operating flight number (codeshare 0) first, then the
+    marketing numbers HKIA lists with it (codeshare 1, 2, ...).
+    """
+    operating = df['codeshare'].to_numpy() == 0
+    if len(operating):
+        # A stray marketing row with no operating row before it stands for its own movement
+        operating[0] = True
+    return operating.cumsum()
+
+
+def dedup_movements(df, keep='last'):
+    """
+    Keep one version of each movement (see MOVEMENT_COLUMNS): all the rows of
+    its last (or first) occurrence, so that a codeshare number HKIA stopped
+    listing goes away with the older version. Any flight number still
+    repeated keeps its `keep` row, and codeshare ranks are renumbered to match.
+    """
+    movement = movements(df)
+    first_rows = np.flatnonzero(np.diff(movement, prepend=0))
+    keyed = df[MOVEMENT_COLUMNS[:-1]].assign(
+        operating_no=df['flight_no'].to_numpy()[first_rows][movement - 1],
+        movement=movement,
+    )
+    versions = keyed.drop_duplicates(subset=MOVEMENT_COLUMNS, keep=keep)['movement']
+    kept = df.assign(movement=movement)[np.isin(movement, versions.to_numpy())]
+    kept = kept.drop_duplicates(subset=KEY_COLUMNS, keep=keep)
+    codeshare = kept.groupby('movement', sort=False).cumcount().astype('int8')
+    return kept.drop(columns='movement').assign(codeshare=codeshare)
+
+
+class FlightStorage:
+    """
+    Flight table stored as one CSV file per (date, flight_type) partition:
+
+        flights_db/2024-11-05/arrival.csv
+        flights_db/2024-11-05/departure.csv
+
+    A refresh only rewrites the partitions whose rows changed, dedup by
+    movement happens inside each partition, and readers load just the
+    date range they need. Partitions are written to a temporary file and
+    renamed into place so readers never see a half-written file.
+    """
+
+    def __init__(self, root='flights_db', legacy_file='hk_flights_database_historical.csv'):
+        self.root = root
+        self.legacy_file = legacy_file
+
+    def partition_path(self, date, flight_type):
+        return os.path.join(self.root, date, f'{flight_type}.csv')
+
+    def partitions(self):
+        """List stored (date, flight_type) partitions in date order"""
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for date in sorted(os.listdir(self.root)):
+            date_dir = os.path.join(self.root, date)
+            if not os.path.isdir(date_dir):
+                continue
+            for name in sorted(os.listdir(date_dir)):
+                if name.endswith('.csv'):
+                    found.append((date, name[:-len('.csv')]))
+        return found
+
+    def dates(self):
+        """Sorted list of dates that have at least one partition"""
+        return sorted({date for date, _ in self.partitions()})
+
+    def migrate_legacy(self):
+        """Split the legacy single-file CSV database into partitions on first use (legacy_file=None: there is none)"""
+        if self.legacy_file is None or self.partitions() or not os.path.exists(self.legacy_file):
+            return
+        print(f"Migrating {self.legacy_file} into {self.root}/")
+        self.write(read_flights_csv(self.legacy_file))
+
+    def write(self, df, replace=False, keep='last'):
+        """
+        Merge new rows into their partitions, keeping the last version of
+        each movement with all its flight numbers (or with keep='first' the
+        stored one, so new rows only fill gaps), or with replace=True make
+        them the partitions' whole content. Returns the list of (date,
+        flight_type) partitions that changed on disk.
+        """
+        if df is None or df.empty:
+            return []
+        written = []
+        for (date, flight_type), new_rows in df.groupby(['date', 'flight_type'], sort=True):
+            path = self.partition_path(date, flight_type)
+            with span('storage.read_partition', flight_type=flight_type):
+                existing = read_flights_csv(path) if os.path.exists(path) else None
+            with span('storage.dedup', flight_type=flight_type):
+                if existing is not None and not replace:
+                    merged = dedup_movements(pd.concat([existing, new_rows[COLUMNS]], ignore_index=True), keep)
+                else:
+                    merged = dedup_movements(new_rows[COLUMNS], keep)
+                merged = merged.sort_values('datetime', ascending=True, kind='stable').reset_index(drop=True)
+                unchanged = existing is not None and merged.equals(existing)
+            if unchanged:
+                continue
+            with span('storage.write_partition', detail=date, flight_type=flight_type):
+                self._write_partition(path, merged)
+            written.append((date, flight_type))
+        return written
+
+    def load(self, start_date=None, end_date=None, flight_types=None):
+        """
+        Load partitions with start_date <= date <= end_date ('YYYY-MM-DD' strings, both optional)
+        """
+        keys = []
+        for date, flight_type in self.partitions():
+            if start_date is not None and date < start_date:
+                continue
+            if end_date is not None and date > end_date:
+                continue
+            if flight_types is not None and flight_type not in flight_types:
+                continue
+            keys.append((date, flight_type))
+        return self.load_partitions(keys)
+
+    def load_partitions(self, keys):
+        """Load an explicit list of (date, flight_type) partitions, skipping missing ones"""
+        frames = []
+        with span('storage.read_partitions'):
+            for date, flight_type in keys:
+                path = self.partition_path(date, flight_type)
+                if os.path.exists(path):
+                    frames.append(read_flights_csv(path))
+        if not frames:
+            return pd.DataFrame(columns=COLUMNS)
+        with span('storage.concat'):
+            df = pd.concat(frames, ignore_index=True)
+            df = df.sort_values('datetime', ascending=True, kind='stable')
+            return df.reset_index(drop=True)
+
+    def _write_partition(self, path, df):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
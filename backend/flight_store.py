@@ -0,0 +1,232 @@
+import os
+import threading
+import pandas as pd
+from aggregates import MOVEMENTS, build_cube, counted, update_cube
+import flight_export
+from flight_database import DB_FILE, FlightDatabase, SqliteSnapshot
+from flight_schema import apply_schema
+from flight_service import sync_flights
+from flight_storage import FlightStorage
+from instrumentation import span
+from ingestion import FLIGHT_TYPES
+from kpi_engine import KpiEngine
+from refresh_scheduler import REFRESH_INTERVAL, RefreshScheduler
+from route_index import RouteIndex
+
+STORE_BACKENDS = ('pandas', 'sqlite')
+# 'sqlite' serves the metrics from an embedded database instead of memory (see flight_database)
+STORE_BACKEND = os.environ.get('CARGOPRISM_BACKEND', 'pandas')
+
+
+class FlightSnapshot:
+    """
+    One consistent version of the flight table and everything derived from it.
+
+    flights is the typed row table (see flight_schema), cube the daily
+    aggregate counts the dashboard metrics are computed from, routes the
+    RouteIndex and kpis the windowed KpiEngine over that cube. Shared between
+    requests; never mutate it.
+
+    The analytics read a snapshot only through version, empty, flight_count,
+    routes, kpis and the query methods below, which the SQLite backend's
+    flight_database.SqliteSnapshot implements as well. The query methods
+    count movements or flight numbers (see aggregates.COUNTS).
+    """
+
+    def __init__(self, flights, cube, version):
+        self.flights = flights
+        self.cube = cube
+        with span('snapshot.route_index'):
+            self.routes = RouteIndex(cube)
+        with span('snapshot.kpi_engine'):
+            self.kpis = KpiEngine(cube)
+        self.version = version
+
+    @property
+    def empty(self):
+        return self.flights.empty
+
+    @property
+    def flight_count(self):
+        return len(self.flights)
+
+    def counts(self, keys, count=MOVEMENTS):
+        """Flights per combination of the given cube keys, as a Series indexed by them"""
+        return counted(self.cube, count).groupby(keys, observed=True)['flights'].sum()
+
+    def cells(self, start=None, end=None, origin=None, destination=None, count=MOVEMENTS):
+        """Cube cells for an origin, destination or route (every cell by default), dated start..end"""
+        cells = counted(self.routes.rows(origin, destination), count)
+        if start is not None:
+            cells = cells[cells['date'] >= start]
+        if end is not None:
+            cells = cells[cells['date'] <= end]
+        return cells
+
+    def flight_rows(self, columns, start=None, end=None, exclude_airline=None, count=MOVEMENTS):
+        """Flight rows dated start..end, optionally leaving one airline out, in stored order"""
+        flights = self.flights
+        keep = pd.Series(True, index=flights.index)
+        if count == MOVEMENTS:
+            keep &= flights['codeshare'] == 0
+        if start is not None:
+            keep &= flights['date'] >= start
+        if end is not None:
+            keep &= flights['date'] <= end
+        if exclude_airline is not None:
+            keep &= flights['airline'] != exclude_airline
+        return flights.loc[keep, columns]
+
+    def export(self, offset=0, limit=None, **filters):
+        """
+        (number of flights matching the flight_export.select_rows filters,
+        generator of export frames for the flights offset..offset + limit)
+        """
+        positions = flight_export.select_rows(self.flights, **filters)
+        end = len(positions) if limit is None else offset + limit
+        return len(positions), flight_export.frames(self.flights, positions[offset:end])
+
+
+class FlightStore:
+    """
+    Process-wide holder of the flight table.
+
+    The table is read from disk once at startup and then kept fresh by a
+    RefreshScheduler, which crawls HKIA in at most one of the processes
+    sharing the storage and has the others follow. Request handlers call
+    snapshot() and get the current FlightSnapshot; a refresh builds a new
+    snapshot and swaps the reference, so a snapshot never changes under a
+    handler. Only the days that changed on disk are reloaded and re-aggregated.
+
+    With the 'sqlite' backend the table is mirrored into a FlightDatabase
+    instead, and snapshots are SqliteSnapshots querying it.
+    """
+
+    def __init__(self, storage=None, refresh_interval=REFRESH_INTERVAL, backend=STORE_BACKEND):
+        if backend not in STORE_BACKENDS:
+            raise ValueError(f"Unknown store backend '{backend}', expected one of {', '.join(STORE_BACKENDS)}")
+        self.storage = storage if storage is not None else FlightStorage()
+        self.database = FlightDatabase(os.path.join(self.storage.root, DB_FILE)) if backend == 'sqlite' else None
+        self._version = 0
+        self._snapshot = FlightSnapshot(pd.DataFrame(), build_cube(pd.DataFrame()), self._version)
+        # Refresh generation (see refresh_scheduler) the snapshot includes
+        self.generation = 0
+        self._update_lock = threading.Lock()
+        self._listeners = []
+        self.scheduler = RefreshScheduler(self, refresh_interval)
+
+    def add_listener(self, callback):
+        """Call callback(snapshot) every time a new snapshot is published"""
+        self._listeners.append(callback)
+
+    def snapshot(self):
+        """Return the current FlightSnapshot (read-only)"""
+        return self._snapshot
+
+    def load(self):
+        """Load the stored partitions without crawling"""
+        if not self.storage.partitions():
+            with self.scheduler.lock:
+                self.storage.migrate_legacy()
+        # Read the generation first: a refresh landing during the load is applied again on the next follow
+        generation = self.scheduler.status_file.read()['generation']
+        with self._update_lock:
+            self.generation = generation
+            with span('store.load'):
+                if self.database is not None:
+                    self._mirror()
+                else:
+                    flights = apply_schema(self.storage.load())
+                    if not flights.empty:
+                        self._publish(flights, build_cube(flights))
+            if not self._snapshot.empty:
+                print(f"Flight store loaded {self._snapshot.flight_count} records from {self.storage.root}")
+            else:
+                print(f"Flight store: no data in {self.storage.root}, waiting for first refresh")
+        return self._snapshot
+
+    def refresh(self):
+        """Crawl new data now and swap in the updated snapshot; see RefreshScheduler.refresh"""
+        return self.scheduler.refresh()
+
+    def sync(self):
+        """
+        Crawl new data into storage and apply it; returns the changed partitions.
+        Called by the scheduler while it holds the refresh lock.
+        """
+        with self._update_lock:
+            with span('store.sync'):
+                written = sync_flights(self.storage)
+            if written:
+                with span('store.apply'):
+                    self._apply(written)
+        return written
+
+    def follow(self, generation, partitions):
+        """
+        Apply another process's refreshes up to generation: reload the given
+        (date, flight_type) partitions, or everything when partitions is None
+        """
+        with self._update_lock:
+            with span('store.follow'):
+                if partitions is None:
+                    self._reload()
+                elif partitions:
+                    self._apply(partitions)
+            self.generation = generation
+        print(f"Flight store followed refresh generation {generation}")
+
+    def start(self):
+        """Load the database and start the background refresh thread"""
+        self.load()
+        self.scheduler.start()
+
+    def stop(self):
+        self.scheduler.stop()
+
+    def _apply(self, written):
+        """Reload only the dates whose partitions changed and patch the cube for them"""
+        if self.database is not None:
+            self._mirror()
+            return
+        current = self._snapshot
+        if current.empty:
+            self._reload()
+            return
+        dates = sorted({date for date, _ in written})
+        kept = current.flights[~current.flights['date'].isin(pd.to_datetime(dates))]
+        fresh = apply_schema(self.storage.load_partitions([(date, flight_type) for date in dates for flight_type in FLIGHT_TYPES]))
+        flights = apply_schema(pd.concat([kept, fresh], ignore_index=True))
+        flights = flights.sort_values('datetime', ascending=True, kind='stable').reset_index(drop=True)
+        cube = update_cube(current.cube, flights, dates)
+        self._publish(flights, cube)
+        print(f"Flight store refreshed {len(dates)} days, {len(flights)} records")
+
+    def _reload(self):
+        if self.database is not None:
+            self._mirror()
+            return
+        flights = apply_schema(self.storage.load())
+        if not flights.empty:
+            self._publish(flights, build_cube(flights))
+            print(f"Flight store reloaded {len(flights)} records from {self.storage.root}")
+
+    def _mirror(self):
+        changed = self.database.mirror(self.storage)
+        # Publish even if nothing changed here: another process may have mirrored the changes already
+        self._swap(SqliteSnapshot(self.database, self._version + 1))
+        if changed:
+            print(f"Flight store mirrored {len(changed)} partitions into {self.database.path}")
+
+    def _publish(self, flights, cube):
+        self._swap(FlightSnapshot(flights.reset_index(drop=True), cube, self._version + 1))
+
+    def _swap(self, snapshot):
+        # A single reference assignment is atomic, so readers see either the old or the new snapshot
+        self._version = snapshot.version
+        self._snapshot = snapshot
+        for callback in self._listeners:
+            try:
+                callback(self._snapshot)
+            except Exception as e:
+                print(f"Flight store listener failed: {str(e)}")
@@ -0,0 +1,122 @@
+from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from instrumentation import span
+
+HKIA_BASE_URL = 'https://www.hongkongairport.com/flightinfo-rest/rest/flights/past'
+FLIGHT_TYPES = ('arrival', 'departure')
+
+
+def build_url(date, flight_type, base_url=HKIA_BASE_URL):
+    """Build the flightinfo-rest URL for one (date, flight_type) page"""
+    if flight_type not in FLIGHT_TYPES:
+        raise ValueError("flight_type must be either 'arrival' or 'departure'")
+    is_arrival = 'true' if flight_type == 'arrival' else 'false'
+    return f'{base_url}?date={date}&lang=en&cargo=true&arrival={is_arrival}'
+
+
+class RateLimiter:
+    """Spaces request starts at least 1/rate seconds apart across all threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class IngestionEngine:
+    """
+    Fetches HKIA flightinfo-rest pages concurrently.
+
+    Requests go through one pooled keep-alive session with a per-request
+    timeout, retries with exponential backoff on connection errors and
+    429/5xx responses, and a shared rate limit so the crawl stays polite.
+    Point base_url at a local stub server (see stub_server.py) to replay
+    recorded pages without touching the network. With an archive (see
+    raw_archive.RawArchive), every page fetched is also stored there as
+    served.
+    """
+
+    def __init__(self, base_url=HKIA_BASE_URL, max_workers=8, timeout=15, retries=3,
+                 backoff_factor=0.5, requests_per_second=5, archive=None):
+        self.base_url = base_url
+        self.archive = archive
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(requests_per_second)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=['GET'],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=max_workers)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch_page(self, date, flight_type):
+        """Fetch the raw JSON page for one date and flight type, or None on failure"""
+        url = build_url(date, flight_type, self.base_url)
+        with span('crawl.rate_limit', flight_type=flight_type):
+            self.rate_limiter.wait()
+        try:
+            with span('crawl.fetch_page', detail=date, flight_type=flight_type):
+                response = self.session.get(url, timeout=self.timeout)
+                if response.status_code == 200:
+                    data = response.json()
+                    if self.archive is not None:
+                        self._archive(date, flight_type, response.content)
+                    return data
+            print(f"Failed to retrieve {flight_type} data for {date}. Status code: {response.status_code}")
+        except Exception as e:
+            print(f"Error retrieving data for {date}: {str(e)}")
+        return None
+
+    def _archive(self, date, flight_type, body):
+        try:
+            with span('crawl.archive_page', flight_type=flight_type):
+                self.archive.put(date, flight_type, body, datetime.now())
+        except Exception as e:
+            # The page itself was fetched fine; losing its archived copy should not lose the data
+            print(f"Error archiving {flight_type} data for {date}: {str(e)}")
+
+    def fetch_pages(self, dates, flight_types=FLIGHT_TYPES):
+        """
+        Fetch every (date, flight_type) page with bounded concurrency.
+        Returns a dict keyed by (date, flight_type) with the raw JSON or None.
+        """
+        return self.fetch_keys([(date, flight_type) for date in dates for flight_type in flight_types])
+
+    def fetch_keys(self, keys):
+        """Fetch an explicit list of (date, flight_type) pages with bounded concurrency"""
+        if not keys:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pages = executor.map(lambda key: self.fetch_page(*key), keys)
+            return dict(zip(keys, pages))
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
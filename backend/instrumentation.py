@@ -0,0 +1,171 @@
+"""
+Timing spans for the pipeline stages, exported as Prometheus histograms and,
+per request, as a Server-Timing header.
+
+    with span('storage.load'):
+        ...
+
+Every span is observed into the process-wide registry (rendered at /metrics)
+and, while a request is being profiled (?profile=1, see TimingMiddleware),
+appended to that request's span list. Set CARGOPRISM_METRICS=0 to turn the
+histograms off; a span then costs one ContextVar lookup.
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+from urllib.parse import parse_qs
+
+METRICS_ENABLED = os.environ.get('CARGOPRISM_METRICS', '1') != '0'
+STAGE_METRIC = 'cargoprism_stage_seconds'
+REQUEST_METRIC = 'cargoprism_http_request_seconds'
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+HELP = {
+    STAGE_METRIC: 'Time spent in each pipeline stage',
+    REQUEST_METRIC: 'HTTP request latency until the response headers are sent',
+}
+
+# The span list of the request being profiled in this context, or None
+_profile = contextvars.ContextVar('profile', default=None)
+
+
+def _labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+
+class MetricsRegistry:
+    """Histograms keyed by (metric name, sorted labels), rendered in the Prometheus text format"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, metric, seconds, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # [per-bucket counts (last one is +Inf), sum]
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += seconds
+
+    def render(self):
+        with self._lock:
+            histograms = {key: ([*counts], total) for key, (counts, total) in self._histograms.items()}
+        lines = []
+        for metric in sorted({metric for metric, _ in histograms}):
+            lines.append(f'# HELP {metric} {HELP.get(metric, metric)}')
+            lines.append(f'# TYPE {metric} histogram')
+            for (name, labels), (counts, total) in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, count in zip([*map(str, self.buckets), '+Inf'], counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{_labels(labels + (("le", bound),))}}} {cumulative}')
+                lines.append(f'{metric}_sum{{{_labels(labels)}}} {total:.6f}')
+                lines.append(f'{metric}_count{{{_labels(labels)}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def render_gauges(gauges):
+    """Prometheus text for point-in-time values: {name: (help, value)}"""
+    lines = []
+    for name, (help_text, value) in gauges.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+    return '\n'.join(lines) + '\n'
+
+
+class span:
+    """
+    Time a block as stage `name`. Extra keyword labels (keep them low
+    cardinality, e.g. flight_type) go to the histogram; `detail` (e.g. a date)
+    only to the request profile.
+    """
+
+    __slots__ = ('name', 'detail', 'labels', 'spans', 'start')
+
+    def __init__(self, name, detail=None, **labels):
+        self.name = name
+        self.detail = detail
+        self.labels = labels
+
+    def __enter__(self):
+        self.spans = _profile.get()
+        if METRICS_ENABLED or self.spans is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not METRICS_ENABLED and self.spans is None:
+            return False
+        elapsed = time.perf_counter() - self.start
+        if METRICS_ENABLED:
+            registry.observe(STAGE_METRIC, elapsed, stage=self.name, **self.labels)
+        if self.spans is not None:
+            name = self.name if self.detail is None else f'{self.name}.{self.detail}'
+            self.spans.append((name, elapsed))
+        return False
+
+
+def profiling():
+    """True while the current request is being profiled"""
+    return _profile.get() is not None
+
+
+def server_timing(spans):
+    """Server-Timing header value for [(name, seconds)], summing repeated stages"""
+    totals = {}
+    for name, seconds in spans:
+        count, total = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, total + seconds)
+    entries = []
+    for name, (count, total) in totals.items():
+        token = ''.join(char if char.isalnum() or char in '-_.' else '_' for char in name)
+        description = f';desc="{name} x{count}"' if count > 1 else ''
+        entries.append(f'{token};dur={total * 1000:.2f}{description}')
+    return ', '.join(entries)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware observing each request's latency per route and, for
+    requests with ?profile=1, collecting their spans into a Server-Timing
+    response header
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        profiled = b'profile=' in scope.get('query_string', b'') and \
+            parse_qs(scope['query_string'].decode('latin-1')).get('profile') == ['1']
+        spans = [] if profiled else None
+        token = _profile.set(spans)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                elapsed = time.perf_counter() - start
+                if METRICS_ENABLED:
+                    route = scope.get('route')
+                    registry.observe(REQUEST_METRIC, elapsed, path=route.path if route is not None else 'unmatched')
+                if spans is not None:
+                    header = server_timing(spans + [('total', elapsed)])
+                    message['headers'] = [*message.get('headers', []), (b'server-timing', header.encode('latin-1'))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _profile.reset(token)
@@ -0,0 +1,256 @@
+import re
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from aggregates import MOVEMENTS, counted, routed
+
+# The dashboards' "last 30 days": 31 days, compared against the 31 before them (see parse_window)
+DEFAULT_WINDOW = '30d'
+COMPARISONS = ('previous', 'year', 'none')
+# '30d', 'month', '2024-10', '2024-09-01:2024-09-30'
+TRAILING_PATTERN = re.compile(r'^(\d+)d$')
+MONTH_PATTERN = re.compile(r'^\d{4}-\d{2}$')
+RANGE_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2}):(\d{4}-\d{2}-\d{2})$')
+# Longest trailing window accepted, about ten years
+MAX_TRAILING_DAYS = 3660
+# Years a window's dates may fall in, well inside pandas' Timestamp range so baselines stay in it too
+WINDOW_YEARS = (1900, 2200)
+# KPIs compared as a percentage change; every other KPI is compared as a difference
+PERCENT_CHANGE_KPIS = ('flights', 'daily_flights', 'market_flights')
+DAILY_MEASURES = ['flights', 'cancelled', 'delayed', 'timed', 'delay_minutes', 'late']
+# Windows whose per-carrier totals a KpiEngine keeps
+GROUPED_WINDOWS = 64
+
+
+class Window:
+    """An inclusive range of dates [start, end] with the number of days it spans"""
+
+    def __init__(self, label, start, end, days):
+        self.label = label
+        self.start = pd.Timestamp(start)
+        self.end = pd.Timestamp(end)
+        self.days = days
+
+    def to_dict(self):
+        return {
+            "label": self.label,
+            "start": self.start.strftime('%Y-%m-%d'),
+            "end": self.end.strftime('%Y-%m-%d'),
+            "days": self.days,
+        }
+
+
+def parse_date(spec, text, fmt):
+    try:
+        day = datetime.strptime(text, fmt)
+    except ValueError:
+        raise ValueError(f"Window '{spec}' names a date that does not exist: {text}")
+    if not WINDOW_YEARS[0] <= day.year <= WINDOW_YEARS[1]:
+        raise ValueError(f"Window '{spec}' must fall within {WINDOW_YEARS[0]}-{WINDOW_YEARS[1]}")
+    return day
+
+
+def check_window_spec(spec):
+    """Raise ValueError unless spec is one of the window forms parse_window() accepts"""
+    if spec == 'month':
+        return
+    if MONTH_PATTERN.match(spec):
+        parse_date(spec, spec, '%Y-%m')
+        return
+    trailing = TRAILING_PATTERN.match(spec)
+    if trailing:
+        if not 1 <= int(trailing.group(1)) <= MAX_TRAILING_DAYS:
+            raise ValueError(f"Trailing window must cover 1 to {MAX_TRAILING_DAYS} days: {spec}")
+        return
+    custom = RANGE_PATTERN.match(spec)
+    if custom:
+        start, end = (parse_date(spec, day, '%Y-%m-%d') for day in custom.groups())
+        if start > end:
+            raise ValueError(f"Window starts after it ends: {spec}")
+        return
+    raise ValueError(f"Unknown window '{spec}', expected e.g. 30d, month, 2024-10 or 2024-09-01:2024-09-30")
+
+
+def parse_window(spec, latest_date):
+    """
+    Resolve a window spec against the latest date in the data:
+
+    - 'Nd': the N days before latest_date plus latest_date itself (N + 1
+      days), the dates the dashboards' "last 30 days" has always covered;
+      its length, daily averages and baseline count all N + 1 of them
+    - 'month': the calendar month containing latest_date, up to latest_date
+    - 'YYYY-MM': that calendar month
+    - 'YYYY-MM-DD:YYYY-MM-DD': a custom inclusive range
+    """
+    check_window_spec(spec)
+    latest_date = pd.Timestamp(latest_date)
+    trailing = TRAILING_PATTERN.match(spec)
+    if trailing:
+        days = int(trailing.group(1))
+        return Window(spec, latest_date - timedelta(days=days), latest_date, days + 1)
+    if spec == 'month':
+        start = latest_date.replace(day=1)
+        return Window(spec, start, latest_date, (latest_date - start).days + 1)
+    if MONTH_PATTERN.match(spec):
+        start = pd.Timestamp(f'{spec}-01')
+        return Window(spec, start, start + pd.offsets.MonthEnd(0), start.days_in_month)
+    start, end = (pd.Timestamp(day) for day in RANGE_PATTERN.match(spec).groups())
+    return Window(spec, start, end, (end - start).days + 1)
+
+
+def baseline_window(window, compare='previous'):
+    """
+    The period window is compared against: the same number of days
+    immediately before it (the previous calendar month for a 'YYYY-MM' window,
+    the same days of the previous month for 'month'), the same dates a year
+    earlier, or None
+    """
+    if compare == 'none':
+        return None
+    if compare == 'year':
+        offset = pd.DateOffset(years=1)
+        return Window(f'{window.label} a year earlier', window.start - offset, window.end - offset, window.days)
+    if compare != 'previous':
+        raise ValueError(f"Unknown comparison '{compare}', expected one of {', '.join(COMPARISONS)}")
+    if window.label == 'month':
+        # Month to date against the same days of the previous month, cut at its end
+        start = window.start - pd.offsets.MonthBegin(1)
+        end = min(start + timedelta(days=window.days - 1), start + pd.offsets.MonthEnd(0))
+        return Window('previous month to date', start, end, (end - start).days + 1)
+    if MONTH_PATTERN.match(window.label):
+        start = window.start - pd.offsets.MonthBegin(1)
+        end = start + pd.offsets.MonthEnd(0)
+        return Window('previous month', start, end, start.days_in_month)
+    end = window.start - timedelta(days=1)
+    return Window(f'previous {window.label}', end - timedelta(days=window.days - 1), end, window.days)
+
+
+def change(name, current, baseline):
+    """Change of one KPI against its baseline value"""
+    if name in PERCENT_CHANGE_KPIS:
+        return (current - baseline) / baseline * 100 if baseline > 0 else 0
+    return current - baseline
+
+
+def kpi_values(totals, days):
+    """Every KPI from a window's totals (see KpiEngine.totals) and its length in days, unrounded"""
+    flights = totals['flights']
+    market_flights = totals['market_flights']
+    completed = flights - totals['cancelled']
+    return {
+        "flights": flights,
+        "daily_flights": flights / days,
+        "ontime_performance": (flights - totals['delayed']) / flights * 100 if flights > 0 else 0,
+        "avg_delay": totals['delay_minutes'] / totals['timed'] if totals['timed'] > 0 else 0,
+        # Share of the flights with an actual time that ran more than ONTIME_THRESHOLD_MINUTES late
+        "late_rate": totals['late'] / totals['timed'] * 100 if totals['timed'] > 0 else 0,
+        "completion_factor": completed / flights * 100 if flights > 0 else 0,
+        "cancellation_rate": totals['cancelled'] / flights * 100 if flights > 0 else 0,
+        "market_flights": market_flights,
+        "market_share": completed / market_flights * 100 if market_flights > 0 else 0,
+        "routes_served": totals['routes'],
+        "competitor_count": totals['competitors'],
+    }
+
+
+class KpiEngine:
+    """
+    Windowed KPIs over a daily cube (see aggregates.build_cube).
+
+    The cube is folded once into per-(date, airline, codeshare) counts and
+    per-date route and airline presence, both sorted by date, so every KPI of
+    any window comes from one date-range slice of each. The totals of every
+    carrier in a window are counted in one grouped pass and kept, so the KPIs
+    of any number of carriers cost about as much as those of one. Every
+    method counts movements or flight numbers (see aggregates.COUNTS). Built
+    once per snapshot; read-only afterwards, apart from that memo.
+    """
+
+    def __init__(self, cube):
+        self._grouped = {}
+        if cube.empty:
+            self.daily = pd.DataFrame(columns=['date', 'airline', 'codeshare'] + DAILY_MEASURES)
+            self.presence = pd.DataFrame(columns=['date', 'airline', 'origin', 'destination', 'codeshare'])
+            self.latest_date = None
+            return
+        status = cube['status_norm']
+        daily = cube.assign(
+            cancelled=cube['flights'].where(status == 'Cancelled', 0),
+            delayed=cube['flights'].where(status == 'Delayed', 0),
+        ).groupby(['date', 'airline', 'codeshare'], sort=True, observed=True)[DAILY_MEASURES].sum()
+        self.daily = daily.reset_index()
+        self.presence = (
+            cube[['date', 'airline', 'origin', 'destination', 'codeshare']]
+            .drop_duplicates()
+            .sort_values('date', kind='stable')
+            .reset_index(drop=True)
+        )
+        self.latest_date = cube['date'].max()
+
+    def _slice(self, table, window):
+        dates = table['date'].to_numpy()
+        start = np.searchsorted(dates, np.datetime64(window.start), side='left')
+        end = np.searchsorted(dates, np.datetime64(window.end), side='right')
+        return table.iloc[start:end]
+
+    def grouped_totals(self, window, count=MOVEMENTS):
+        """
+        The totals (see totals) of every carrier flying in the window as
+        {"carriers": {carrier: counts}, "market_flights": ..., "airlines": ...},
+        computed in one grouped pass and memoized per date range and count
+        """
+        key = (window.start, window.end, count)
+        grouped = self._grouped.get(key)
+        if grouped is None:
+            if len(self._grouped) >= GROUPED_WINDOWS:
+                self._grouped.clear()
+            grouped = self._grouped[key] = self._group(window, count)
+        return grouped
+
+    def clear_memo(self):
+        """Forget the memoized window totals, so the next KPIs are computed from scratch (for benchmarks)"""
+        self._grouped.clear()
+
+    def _group(self, window, count):
+        daily = counted(self._slice(self.daily, window), count)
+        presence = counted(self._slice(self.presence, window), count)
+        by_carrier = daily.groupby('airline', observed=True)[DAILY_MEASURES].sum()
+        # A carrier with hub-to-hub rows only serves no route
+        by_carrier['routes'] = routed(presence[['airline', 'origin', 'destination']]).drop_duplicates() \
+            .groupby('airline', observed=True).size().reindex(by_carrier.index, fill_value=0)
+        return {
+            "carriers": {
+                carrier: {name: int(value) for name, value in zip(by_carrier.columns, values)}
+                for carrier, values in zip(by_carrier.index, by_carrier.to_numpy())
+            },
+            "market_flights": int(daily['flights'].sum() - daily['cancelled'].sum()),
+            "airlines": int(presence['airline'].nunique()),
+        }
+
+    def totals(self, window, carrier, count=MOVEMENTS):
+        """The counts every KPI of one window for one carrier is derived from (see kpi_values)"""
+        grouped = self.grouped_totals(window, count)
+        counts = grouped["carriers"].get(carrier)
+        return {
+            **(counts if counts is not None else dict.fromkeys(DAILY_MEASURES + ['routes'], 0)),
+            "market_flights": grouped["market_flights"],
+            "competitors": grouped["airlines"] - (counts is not None),
+        }
+
+    def kpis(self, window, carrier, count=MOVEMENTS):
+        """Every KPI of one window for one carrier, unrounded"""
+        return kpi_values(self.totals(window, carrier, count), window.days)
+
+    def compare(self, window, baseline, carrier, count=MOVEMENTS):
+        """
+        {kpi: {"value": ..., "change": ...}} for the window against its
+        baseline (change omitted without one)
+        """
+        current = self.kpis(window, carrier, count)
+        if baseline is None:
+            return {name: {"value": value} for name, value in current.items()}
+        previous = self.kpis(baseline, carrier, count)
+        return {
+            name: {"value": value, "change": change(name, value, previous[name])}
+            for name, value in current.items()
+        }
@@ -0,0 +1,91 @@
+"""
+Import the older flight history in cleaned.csv into the partitioned store.
+
+    python legacy_import.py [cleaned.csv]
+
+cleaned.csv predates the current schema: its origin and destination hold
+full names such as "Malpensa International Airport (MXP)" and there are no
+*_name columns. The file is read in chunks of CHUNK_ROWS; codes are taken
+from the trailing "(XXX)" of each name with vectorized string ops, falling
+back to the iata.json name index for names without one. A station that
+resolves to neither (the file's "Unknown" origins) is stored as the hub,
+as parse_hk_flights does for flights HKIA lists without one, and counted.
+Stored rows win over imported ones with the same key, so the import only
+fills in history the crawler does not have.
+"""
+import sys
+import time
+import pandas as pd
+from airport_index import get_airport_index
+from data_utils import HUB, HUB_NAME
+from flight_storage import COLUMNS, FlightStorage
+from refresh_scheduler import recorded_refresh
+
+LEGACY_FILE = 'cleaned.csv'
+CHUNK_ROWS = 50_000
+CODE_PATTERN = r'\(([A-Z0-9]{3})\)$'
+NAME_PATTERN = r'\s*\([A-Z0-9]{3}\)$'
+STATION_COLUMNS = ('origin', 'destination')
+
+
+def resolve_stations(names, index):
+    """(IATA codes, airport names) for a Series of legacy station names; codes are NaN where unresolved"""
+    codes = names.str.extract(CODE_PATTERN, expand=False)
+    codes = codes.fillna(names.map(index.codes()))
+    airport_names = codes.map(index.names()).fillna(names.str.replace(NAME_PATTERN, '', regex=True))
+    return codes, airport_names.where(codes != HUB, index.name(HUB, HUB_NAME))
+
+
+def convert_chunk(chunk, index):
+    """A chunk of cleaned.csv in the storage schema, and how many of its rows had an unresolved station"""
+    flights = chunk.copy()
+    unresolved = pd.Series(False, index=flights.index)
+    for column in STATION_COLUMNS:
+        # Legacy stations repeat heavily; resolve each distinct name once
+        positions, names = pd.factorize(flights[column])
+        codes, airport_names = resolve_stations(pd.Series(names), index)
+        missing = codes.isna().to_numpy()
+        codes[missing] = HUB
+        airport_names[missing] = index.name(HUB, HUB_NAME)
+        flights[column] = codes.to_numpy(dtype=object)[positions]
+        flights[f'{column}_name'] = airport_names.to_numpy(dtype=object)[positions]
+        unresolved |= missing[positions]
+    flights['datetime'] = pd.to_datetime(flights['datetime'], format='%Y-%m-%d %H:%M:%S')
+    # The file does not say which flight numbers share a movement, so each row counts as its own
+    flights['codeshare'] = pd.Series(0, index=flights.index, dtype='int8')
+    return flights[COLUMNS], int(unresolved.sum())
+
+
+def import_legacy(storage, filename=LEGACY_FILE, chunk_rows=CHUNK_ROWS):
+    """
+    Stream filename into storage chunk by chunk, keeping stored rows on key
+    clashes. Returns (changed (date, flight_type) partitions, rows read, rows
+    stored at the hub for an unresolved station).
+    """
+    index = get_airport_index()
+    written, rows, at_hub = set(), 0, 0
+    for chunk in pd.read_csv(filename, dtype=str, keep_default_na=False, chunksize=chunk_rows):
+        flights, unresolved = convert_chunk(chunk, index)
+        rows += len(chunk)
+        at_hub += unresolved
+        written.update(storage.write(flights, keep='first'))
+    return sorted(written), rows, at_hub
+
+
+def main(filename):
+    storage = FlightStorage()
+    storage.migrate_legacy()
+    start = time.perf_counter()
+    counts = {}
+
+    def run():
+        written, counts['rows'], counts['at_hub'] = import_legacy(storage, filename)
+        return written
+
+    written = recorded_refresh(storage.root, run)
+    print(f"Imported {filename} in {time.perf_counter() - start:.1f}s: {counts['rows']} rows read, "
+          f"{counts['at_hub']} stored at {HUB} for an unresolved station, {len(written)} partitions changed")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else LEGACY_FILE)
@@ -0,0 +1,126 @@
+"""
+Load-test the dashboard endpoints with concurrent simulated users.
+
+    python load_test.py [users] [rounds] [base_url]
+
+Each user loads every dashboard page (the requests below) once per round,
+all users starting each round together. Without base_url the app is served
+in-process from the stored partitions (no crawling), and every round runs
+twice: cold, right after the response cache is dropped as a data refresh
+would, so all users stampede the same uncomputed responses, then warm.
+Prints p50/p95/p99/max latency per phase.
+"""
+import asyncio
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+import httpx
+import numpy as np
+
+DASHBOARD_REQUESTS = [
+    '/hkia',
+    '/overview',
+    '/overview?origin=LAX',
+    '/market-metrics',
+    '/performance',
+]
+HEADERS = {'Accept-Encoding': 'gzip'}
+
+
+def serve(port, commands):
+    """
+    Child process: serve the app from the stored partitions (no crawling) and
+    drop the response cache whenever the parent asks, as a data refresh would
+    """
+    import uvicorn
+    import server as app_server
+
+    app_server.store.load()
+
+    def listen():
+        while True:
+            commands.recv()
+            app_server.cache.invalidate()
+            commands.send('invalidated')
+
+    threading.Thread(target=listen, daemon=True).start()
+    uvicorn.run(app_server.app, host='127.0.0.1', port=port, lifespan='off', log_level='warning')
+
+
+def serve_in_process():
+    """
+    Start the app in a separate process, so the load generator does not share
+    its GIL, on a free local port. Returns (process, command pipe, base_url).
+    """
+    parent, child = multiprocessing.Pipe()
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    process = multiprocessing.Process(target=serve, args=(port, child), daemon=True)
+    process.start()
+    base_url = f'http://127.0.0.1:{port}'
+    while True:
+        try:
+            httpx.get(f'{base_url}/cache-stats').raise_for_status()
+            return process, parent, base_url
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+
+async def user(client, latencies):
+    for path in DASHBOARD_REQUESTS:
+        start = time.perf_counter()
+        response = await client.get(path, headers=HEADERS)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run_round(client, users):
+    latencies = []
+    await asyncio.gather(*(user(client, latencies) for _ in range(users)))
+    return latencies
+
+
+def report(name, latencies, elapsed):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"{name:<6} {len(latencies):>7} {len(latencies) / elapsed:>8.0f} "
+          f"{p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {max(latencies):>8.1f}")
+
+
+async def main(users, rounds, base_url):
+    process = commands = None
+    if base_url is None:
+        process, commands, base_url = serve_in_process()
+
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await run_round(client, 1)  # warm up connections and imports
+        phases = {'cold': [], 'warm': []} if process is not None else {'warm': []}
+        elapsed = dict.fromkeys(phases, 0.0)
+        for _ in range(rounds):
+            for phase in phases:
+                if phase == 'cold':
+                    commands.send('invalidate')
+                    commands.recv()
+                start = time.perf_counter()
+                phases[phase] += await run_round(client, users)
+                elapsed[phase] += time.perf_counter() - start
+
+        stats = (await client.get('/cache-stats')).json()
+
+    print(f"{users} users x {rounds} rounds x {len(DASHBOARD_REQUESTS)} requests against {base_url}")
+    print(f"{'phase':<6} {'requests':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for phase, latencies in phases.items():
+        report(phase, latencies, elapsed[phase])
+    print(f"server: {stats}")
+    if process is not None:
+        process.terminate()
+
+
+if __name__ == '__main__':
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    base_url = sys.argv[3] if len(sys.argv) > 3 else None
+    asyncio.run(main(users, rounds, base_url))
@@ -0,0 +1,207 @@
+"""
+Archive of the raw flightinfo-rest responses, so that the flight store can be
+rebuilt offline (e.g. after a parser fix) instead of crawling HKIA again.
+
+    flights_archive/objects/3f/3fa2...e1.json.zst   one compressed body per distinct response
+    flights_archive/index/2024-11-05.jsonl          one line per fetch of that date's pages
+
+Bodies are stored under the SHA-256 of their bytes, so a page that has not
+changed since its last fetch only costs an index line. They are compressed
+with zstd when the zstandard package is installed and gzip otherwise; the
+index records which, so an archive written with either reads back as long
+as its codec is available.
+
+    python raw_archive.py replay [start_date [end_date]]   rebuild flights_db from the archive
+    python raw_archive.py import [hk_flights_raw.json]      archive the pages recorded by test.py
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import pandas as pd
+from data_utils import get_airport_data, parse_hk_flights
+from flight_storage import FlightStorage
+from refresh_scheduler import recorded_refresh
+from sync_planner import SyncManifest
+
+# Optional: zstd compresses these pages smaller and faster than gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_ROOT = 'flights_archive'
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+CODEC_EXTENSIONS = {'zstd': 'zst', 'gzip': 'gz'}
+
+
+def default_codec():
+    return 'zstd' if zstandard is not None else 'gzip'
+
+
+def compress(body, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def decompress(blob, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("This archive holds zstd objects; install the zstandard package to read them")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+
+class RawArchive:
+    """
+    The raw response archive under `root` (see the module docstring).
+    put() may be called from several fetch threads at once; index lines are
+    appended under a lock, and objects are written to a temporary file and
+    renamed into place.
+    """
+
+    def __init__(self, root=ARCHIVE_ROOT, codec=None):
+        self.root = root
+        self.codec = codec or default_codec()
+        self._index_lock = threading.Lock()
+
+    def object_path(self, digest, codec):
+        return os.path.join(self.root, 'objects', digest[:2], f'{digest}.json.{CODEC_EXTENSIONS[codec]}')
+
+    def index_path(self, date):
+        return os.path.join(self.root, 'index', f'{date}.jsonl')
+
+    def put(self, date, flight_type, body, fetched_at=None):
+        """Archive the response body (bytes) of one (date, flight_type) page fetch; returns its digest"""
+        if fetched_at is None:
+            fetched_at = datetime.now()
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.object_path(digest, self.codec)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(compress(body, self.codec))
+            os.replace(tmp_path, path)
+        entry = {
+            'date': date,
+            'flight_type': flight_type,
+            'fetched_at': fetched_at.isoformat(timespec='seconds'),
+            'sha256': digest,
+            'codec': self.codec,
+            'size': len(body),
+        }
+        index_path = self.index_path(date)
+        with self._index_lock:
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            with open(index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+        return digest
+
+    def dates(self):
+        """Sorted dates with at least one archived fetch"""
+        index_dir = os.path.join(self.root, 'index')
+        if not os.path.isdir(index_dir):
+            return []
+        return sorted(name[:-len('.jsonl')] for name in os.listdir(index_dir) if name.endswith('.jsonl'))
+
+    def fetches(self, date):
+        """Index entries of the fetches of one date's pages, oldest first"""
+        try:
+            with open(self.index_path(date), encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+        return sorted(entries, key=lambda entry: entry['fetched_at'])
+
+    def read(self, entry):
+        """The raw JSON page of an index entry"""
+        with open(self.object_path(entry['sha256'], entry['codec']), 'rb') as f:
+            return json.loads(decompress(f.read(), entry['codec']))
+
+
+def replay_date(archive_root, storage_root, date):
+    """
+    Re-parse every archived fetch of one date's pages, oldest first, and
+    replace that date's partitions with the result, keeping the last row per
+    key as a refresh would. Returns (changed partitions, {flight_type:
+    (rows, fetched_at) of the last fetch}).
+    """
+    archive = RawArchive(archive_root)
+    airport_data = get_airport_data()
+    frames, latest = [], {}
+    for entry in archive.fetches(date):
+        df = parse_hk_flights(archive.read(entry), entry['flight_type'], airport_data)
+        latest[entry['flight_type']] = (0 if df is None else len(df), entry['fetched_at'])
+        if df is not None:
+            frames.append(df)
+    if not frames:
+        return [], latest
+    # write() keeps the last row per key, i.e. the one from the latest fetch
+    return FlightStorage(storage_root).write(pd.concat(frames, ignore_index=True), replace=True), latest
+
+
+def replay(archive, storage, start_date=None, end_date=None, workers=None):
+    """
+    Rebuild storage's partitions dated start_date..end_date (both optional)
+    from the archive, one date per task across `workers` processes (default:
+    one per core), without touching the network. The sync manifest is
+    updated so the planner does not fetch the replayed pages again. Returns
+    the (date, flight_type) partitions that changed.
+    """
+    dates = [date for date in archive.dates()
+             if (start_date is None or date >= start_date) and (end_date is None or date <= end_date)]
+    manifest = SyncManifest(os.path.join(storage.root, 'manifest.json'))
+    written = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(replay_date, [archive.root] * len(dates), [storage.root] * len(dates), dates)
+        for date, (changed, latest) in zip(dates, results):
+            written += changed
+            for flight_type, (rows, fetched_at) in latest.items():
+                entry = manifest.get(date, flight_type)
+                if entry is None or entry['fetched_at'] <= fetched_at:
+                    manifest.record(date, flight_type, rows, datetime.fromisoformat(fetched_at))
+    manifest.save()
+    return sorted(written)
+
+
+def import_recorded(archive, filename='hk_flights_raw.json'):
+    """Archive the pages recorded by test.py, as fetched when the file was written; returns how many"""
+    fetched_at = datetime.fromtimestamp(os.path.getmtime(filename))
+    with open(filename, encoding='utf-8') as f:
+        entries = json.load(f)
+    for entry in entries:
+        body = json.dumps(entry['data'], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        archive.put(entry['date'], entry['type'], body, fetched_at)
+    return len(entries)
+
+
+def main(argv):
+    command = argv[0] if argv else None
+    archive = RawArchive()
+    if command == 'import':
+        filename = argv[1] if len(argv) > 1 else 'hk_flights_raw.json'
+        print(f"Archived {import_recorded(archive, filename)} pages from {filename} into {archive.root}/")
+    elif command == 'replay':
+        start_date = argv[1] if len(argv) > 1 else None
+        end_date = argv[2] if len(argv) > 2 else None
+        storage = FlightStorage()
+        start = time.perf_counter()
+        written = recorded_refresh(storage.root, lambda: replay(archive, storage, start_date, end_date))
+        print(f"Replayed {archive.root}/ into {storage.root}/ in {time.perf_counter() - start:.1f}s; "
+              f"{len(written)} partitions changed")
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
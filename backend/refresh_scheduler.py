@@ -0,0 +1,265 @@
+"""
+Refresh scheduling shared by every server process that works on one flights_db.
+
+Each uvicorn worker runs its own FlightStore over the same partition
+directory. The scheduler makes them crawl HKIA once per interval between
+them instead of once each:
+
+- a refresh asked for while one is running in the process waits for that
+  one instead of starting another (single-flight);
+- the crawl and the partition and manifest writes happen under an exclusive
+  lock on flights_db/.refresh.lock, so one process crawls at a time;
+- flights_db/refresh_status.json, rewritten atomically after every crawl,
+  holds the refresh generation, when the last refresh ran, how long it took
+  and which partitions it changed. The other processes poll it, reload just
+  those partitions and skip their own crawl until the next one is due.
+"""
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Not on POSIX: the lock then only excludes threads of this process
+    fcntl = None
+
+# How often HKIA is re-crawled, across all processes sharing the database
+REFRESH_INTERVAL = 60 * 60
+# How often each process checks the shared status for another process's refresh
+POLL_INTERVAL = 30
+# Refresh generations whose changed partitions the status file remembers; a
+# process that fell further behind reloads everything
+CHANGE_HISTORY = 48
+LOCK_FILE = '.refresh.lock'
+STATUS_FILE = 'refresh_status.json'
+
+
+class FileLock:
+    """Exclusive lock on a file, held by one thread of one process at a time"""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def acquire(self, blocking=True):
+        if not self._thread_lock.acquire(blocking):
+            return False
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            lock_file = open(self.path, 'a')
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    lock_file.close()
+                    self._thread_lock.release()
+                    return False
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        self._file = lock_file
+        return True
+
+    def release(self):
+        lock_file, self._file = self._file, None
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        lock_file.close()
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+        return False
+
+
+class RefreshStatus:
+    """The shared refresh status file; written atomically, so readers need no lock"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'generation': 0, 'changes': []}
+
+    def write(self, status):
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def changed_since(status, generation):
+    """Partitions changed by the refreshes after generation, or None if they are no longer all recorded"""
+    changes = [change for change in status['changes'] if change['generation'] > generation]
+    if len(changes) < status['generation'] - generation:
+        return None
+    return sorted({tuple(partition) for change in changes for partition in change['partitions']})
+
+
+def record_refresh(status_file, status, sync):
+    """
+    Run sync() (which returns the changed partitions) and record it in status
+    and the status file. Call with the refresh lock held and status freshly read.
+    """
+    started_at = datetime.now()
+    start = time.perf_counter()
+    status['last_attempt_at'] = started_at.isoformat(timespec='seconds')
+    try:
+        written = sync()
+    except Exception as e:
+        status['last_error'] = str(e)
+        status_file.write(status)
+        raise
+    if written:
+        status['generation'] += 1
+        status['changes'] = (status['changes'] + [{
+            'generation': status['generation'],
+            'partitions': [list(partition) for partition in written],
+        }])[-CHANGE_HISTORY:]
+    status.update({
+        'last_refresh_at': started_at.isoformat(timespec='seconds'),
+        'last_refresh_seconds': round(time.perf_counter() - start, 3),
+        'last_changed_partitions': len(written),
+        'last_error': None,
+        'refreshed_by': os.getpid(),
+    })
+    status_file.write(status)
+    return written
+
+
+def recorded_refresh(storage_root, sync):
+    """
+    Run sync() as a refresh of the store under storage_root from outside the
+    scheduler (a CLI or script): under the refresh lock and recorded in the
+    status file, so running servers load the partitions it changed. Returns them.
+    """
+    status_file = RefreshStatus(os.path.join(storage_root, STATUS_FILE))
+    with FileLock(os.path.join(storage_root, LOCK_FILE)):
+        return record_refresh(status_file, status_file.read(), sync)
+
+
+class RefreshScheduler:
+    """
+    Runs store.sync() every `interval` seconds on a background thread,
+    coordinated with the other processes through the lock and status files
+    in the store's storage root (see the module docstring).
+    """
+
+    def __init__(self, store, interval=REFRESH_INTERVAL, poll_interval=POLL_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self.poll_interval = min(poll_interval, interval)
+        self.lock = FileLock(os.path.join(store.storage.root, LOCK_FILE))
+        self.status_file = RefreshStatus(os.path.join(store.storage.root, STATUS_FILE))
+        self._running = None
+        self._running_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def refresh(self, force=True):
+        """
+        Crawl now (or, with force=False, only if no process crawled within the
+        interval) and return the store's snapshot. A call made while a refresh
+        is running in this process waits for it and shares its outcome.
+        """
+        with self._running_lock:
+            running = self._running
+            if running is None:
+                running = self._running = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            running.result()
+            return self.store.snapshot()
+        try:
+            self._refresh(force)
+            running.set_result(None)
+        except BaseException as e:
+            running.set_exception(e)
+            raise
+        finally:
+            with self._running_lock:
+                self._running = None
+        return self.store.snapshot()
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='flight-store-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def status(self):
+        """The last refresh across all processes, and where this process stands"""
+        status = self.status_file.read()
+        last_attempt = status.get('last_attempt_at')
+        next_refresh = None
+        if last_attempt is not None:
+            next_refresh = (datetime.fromisoformat(last_attempt) + timedelta(seconds=self.interval)).isoformat(timespec='seconds')
+        snapshot = self.store.snapshot()
+        return {
+            "generation": status['generation'],
+            "last_refresh_at": status.get('last_refresh_at'),
+            "last_refresh_seconds": status.get('last_refresh_seconds'),
+            "last_changed_partitions": status.get('last_changed_partitions'),
+            "last_attempt_at": last_attempt,
+            "last_error": status.get('last_error'),
+            "refreshed_by": status.get('refreshed_by'),
+            "next_refresh_at": next_refresh,
+            "refresh_interval_seconds": self.interval,
+            "process": {
+                "pid": os.getpid(),
+                "refreshing": self._running is not None,
+                "generation": self.store.generation,
+                "snapshot_version": snapshot.version,
+                "flights": snapshot.flight_count,
+            },
+        }
+
+    def _due(self, status):
+        last_attempt = status.get('last_attempt_at')
+        return last_attempt is None or \
+            datetime.now() - datetime.fromisoformat(last_attempt) >= timedelta(seconds=self.interval)
+
+    def _follow(self, status):
+        if status['generation'] != self.store.generation:
+            self.store.follow(status['generation'], changed_since(status, self.store.generation))
+
+    def _refresh(self, force):
+        with self.lock:
+            status = self.status_file.read()
+            self._follow(status)
+            if not force and not self._due(status):
+                return
+            record_refresh(self.status_file, status, self.store.sync)
+            self.store.generation = status['generation']
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                status = self.status_file.read()
+                if self._due(status):
+                    self.refresh(force=False)
+                else:
+                    self._follow(status)
+            except Exception as e:
+                print(f"Flight store refresh failed: {str(e)}")
+            self._stop_event.wait(self.poll_interval)
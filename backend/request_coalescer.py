@@ -0,0 +1,51 @@
+import asyncio
+import contextvars
+
+
+class RequestCoalescer:
+    """
+    Runs blocking work on an executor with at most one run per key in flight.
+
+    Concurrent callers with the same key (e.g. N dashboards asking for the
+    same cold /performance) await the one running computation instead of
+    each starting their own. Lives on the event loop; not thread-safe.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self._inflight = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key, func):
+        """Return func()'s result, sharing a run already in flight for key"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._submit(func)
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        # A caller that goes away must not cancel the run the others are waiting for
+        return await asyncio.shield(future)
+
+    async def run_alone(self, func):
+        """Return func()'s result from a run of its own, shared with no other caller"""
+        self.started += 1
+        return await self._submit(func)
+
+    def _submit(self, func):
+        # Run in a copy of the caller's context so that its timing spans reach the caller's profile
+        context = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(self.executor, context.run, func)
+
+    def _forget(self, key, future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            # Mark the exception retrieved; every waiter re-raises it from its own await
+            future.exception()
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "started": self.started, "coalesced": self.coalesced}
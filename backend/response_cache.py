@@ -0,0 +1,127 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from instrumentation import span
+from response_encoding import compress
+
+
+def normalize_params(params):
+    """Drop unset query parameters and sort the rest so equivalent queries share a key"""
+    return tuple(sorted((name, str(value)) for name, value in params.items() if value not in (None, '')))
+
+
+def make_etag(body):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Compare an If-None-Match header against an ETag (weak comparison, as for GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return etag in [tag[2:] if tag.startswith('W/') else tag for tag in candidates]
+
+
+class ResponseCache:
+    """
+    LRU cache of encoded response bodies keyed by (endpoint, normalized params,
+    dataset version). Bounded both by entry count and by total body size,
+    compressed variants of an entry included; they are made on first request
+    and dropped with the entry.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        # key -> {content encoding: (body, etag)}
+        self._variants = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return (body, etag) for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body):
+        """Store an encoded body and return (body, etag)"""
+        entry = (body, make_etag(body))
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            self._evict()
+        return entry
+
+    def variant(self, key, entry, encoding):
+        """(body, etag) of an entry in the given encoding if it needs no compressing, else None"""
+        if encoding is None:
+            return entry
+        with self._lock:
+            return self._variants.get(key, {}).get(encoding)
+
+    def encoded(self, key, entry, encoding):
+        """
+        Return (body, etag) of a cached entry in the given Content-Encoding
+        (None for identity), compressing it once and caching the result. The
+        variant's ETag is the entry's with the encoding appended.
+        """
+        variant = self.variant(key, entry, encoding)
+        if variant is not None:
+            return variant
+        with span('response.compress', encoding=encoding):
+            variant = (compress(entry[0], encoding), f'{entry[1][:-1]}-{encoding}"')
+        with self._lock:
+            # Only keep it if the entry was not evicted or replaced meanwhile
+            if self._entries.get(key) is entry:
+                variants = self._variants.setdefault(key, {})
+                if encoding not in variants:
+                    variants[encoding] = variant
+                    self._bytes += len(variant[0])
+                    self._evict()
+        return variant
+
+    def _drop(self, key):
+        body, _ = self._entries.pop(key)
+        self._bytes -= len(body)
+        for variant, _ in self._variants.pop(key, {}).values():
+            self._bytes -= len(variant)
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self):
+        """Drop every entry, e.g. after the flight store publishes new data"""
+        with self._lock:
+            self._entries.clear()
+            self._variants.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            }
@@ -0,0 +1,66 @@
+import gzip
+import json
+from fastapi.encoders import jsonable_encoder
+
+# Optional accelerators: orjson for encoding, brotli for Content-Encoding: br
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Bodies smaller than this go out uncompressed
+MINIMUM_COMPRESS_SIZE = 1024
+
+
+def dumps(payload):
+    """
+    Encode a response payload to compact UTF-8 JSON bytes. Uses orjson when it
+    is installed (numpy scalars and arrays serialize natively) and the
+    standard library otherwise.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Types orjson does not know (e.g. pandas objects) take the slow path below
+            pass
+    payload = jsonable_encoder(payload)
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode('utf-8')
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encoding):
+    """
+    Pick the Content-Encoding for an Accept-Encoding header: brotli if the
+    client and server both support it, then gzip, else None (identity)
+    """
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q=') and quality[2:].strip() in ('0', '0.0', '0.00', '0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in supported_encodings():
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
@@ -0,0 +1,85 @@
+import numpy as np
+from aggregates import routed
+
+# Route order of the indexed cube: every origin, and every (origin, destination) pair, is one contiguous block
+ROUTE_ORDER = ['origin', 'destination', 'airline', 'date']
+
+
+def _block_bounds(codes):
+    """(start, stop) of each run of equal rows in a sorted 2D array of category codes"""
+    if not len(codes):
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    changed = np.ones(len(codes), dtype=bool)
+    changed[1:] = (codes[1:] != codes[:-1]).any(axis=1)
+    starts = np.flatnonzero(changed)
+    stops = np.append(starts[1:], len(codes))
+    return starts, stops
+
+
+class RouteIndex:
+    """
+    Route lookups over a daily cube (see aggregates.build_cube).
+
+    Holds a copy of the cube sorted by origin, destination, airline and date,
+    with the row range of every origin and every (origin, destination) pair in
+    it, plus per-airline origin -> destinations and destination -> origins
+    maps for the station lists. Built once per snapshot; read-only afterwards.
+    """
+
+    def __init__(self, cube):
+        self.cube = cube.sort_values(ROUTE_ORDER, kind='stable').reset_index(drop=True)
+        self._origin_rows = {}
+        self._route_rows = {}
+        self._destination_routes = {}
+        self._destinations = {}
+        self._origins = {}
+        if self.cube.empty:
+            return
+
+        origin = self.cube['origin'].astype(str).to_numpy()
+        destination = self.cube['destination'].astype(str).to_numpy()
+        codes = np.column_stack([
+            self.cube['origin'].cat.codes.to_numpy(),
+            self.cube['destination'].cat.codes.to_numpy(),
+        ])
+        for start, stop in zip(*_block_bounds(codes[:, :1])):
+            self._origin_rows[origin[start]] = (int(start), int(stop))
+        for start, stop in zip(*_block_bounds(codes)):
+            route = (origin[start], destination[start])
+            self._route_rows[route] = (int(start), int(stop))
+            self._destination_routes.setdefault(route[1], []).append(route)
+
+        routes = routed(self.cube[['airline', 'origin', 'destination']]).drop_duplicates()
+        for airline, route_origin, route_destination in routes.astype(str).itertuples(index=False):
+            self._destinations.setdefault(airline, {}).setdefault(route_origin, set()).add(route_destination)
+            self._origins.setdefault(airline, {}).setdefault(route_destination, set()).add(route_origin)
+
+    def destinations(self, airline, origin=None):
+        """Sorted destinations the airline flies to, from origin if given"""
+        by_origin = self._destinations.get(airline, {})
+        if origin is not None:
+            return sorted(by_origin.get(origin, ()))
+        return sorted(set().union(*by_origin.values()))
+
+    def origins(self, airline, destination=None):
+        """Sorted origins the airline flies from, to destination if given"""
+        by_destination = self._origins.get(airline, {})
+        if destination is not None:
+            return sorted(by_destination.get(destination, ()))
+        return sorted(set().union(*by_destination.values()))
+
+    def rows(self, origin=None, destination=None):
+        """Cube rows (every airline) for an origin, a destination, or one route"""
+        if origin and destination:
+            ranges = [self._route_rows[(origin, destination)]] if (origin, destination) in self._route_rows else []
+        elif origin:
+            ranges = [self._origin_rows[origin]] if origin in self._origin_rows else []
+        elif destination:
+            ranges = [self._route_rows[route] for route in self._destination_routes.get(destination, [])]
+        else:
+            return self.cube
+        if len(ranges) == 1:
+            start, stop = ranges[0]
+            return self.cube.iloc[start:stop]
+        positions = np.concatenate([np.arange(start, stop) for start, stop in ranges]) if ranges else []
+        return self.cube.iloc[positions]
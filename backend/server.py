@@ -1,10 +1,45 @@
-from fastapi import FastAPI
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date
+import os
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from flight_service import update_flights_database
-from datetime import datetime, timedelta
-import pandas as pd
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from aggregates import COUNTS, MOVEMENTS
+from event_stream import UpdateBroadcaster
+import flight_export
+from flight_store import FlightStore
+from instrumentation import TimingMiddleware, profiling, registry, render_gauges, span
+from kpi_engine import COMPARISONS, DEFAULT_WINDOW, check_window_spec
+from request_coalescer import RequestCoalescer
+from response_cache import ResponseCache, etag_matches, normalize_params
+from response_encoding import GZIP_LEVEL, MINIMUM_COMPRESS_SIZE, choose_encoding, dumps
+import analytics
 
-app = FastAPI()
+# Threads for the pandas work behind cache misses, kept apart from Starlette's
+# threadpool so a burst of cold analytics cannot starve the other requests
+ANALYTICS_WORKERS = min(4, os.cpu_count() or 1)
+
+store = FlightStore()
+cache = ResponseCache()
+executor = ThreadPoolExecutor(max_workers=ANALYTICS_WORKERS, thread_name_prefix='analytics')
+coalescer = RequestCoalescer(executor)
+# Cached bodies belong to the old dataset version once a refresh lands
+store.add_listener(lambda snapshot: cache.invalidate())
+# Computes what each refresh changed on the dashboards once, for every /events subscriber
+broadcaster = UpdateBroadcaster()
+store.add_listener(broadcaster.publish)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load once at startup; the store keeps itself fresh in the background
+    store.start()
+    yield
+    store.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware configuration
 app.add_middleware(
@@ -13,361 +48,214 @@ app.add_middleware(
     allow_credentials=False,  # Changed to False since we're using allow_origins=["*"]
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Snapshot-Version", "X-Total-Count", "X-Next-Offset", "Server-Timing"],
 )
+# Compresses the responses that are not precompressed by cached_response, e.g. /flights streams
+app.add_middleware(GZipMiddleware, minimum_size=MINIMUM_COMPRESS_SIZE, compresslevel=GZIP_LEVEL)
+# Outermost, so request latency covers the other middleware; ?profile=1 adds a Server-Timing header
+app.add_middleware(TimingMiddleware)
 
-@app.get("/hkia")
-def hkia():
-    df = update_flights_database()
-    
-    if not df.empty:
-        daily_flights = df.groupby(['date', 'flight_type']).size().unstack(fill_value=0)
-        return {
-            "totalNumOfFlights": len(df), 
-            "numOfUniqueAirlines": df['airline'].nunique(), 
-            "dateRange": f"{df['date'].min()} to {df['date'].max()}", 
-            "flightsByType": df['flight_type'].value_counts().to_dict(), 
-            "mostFreqAirlines": df['airline'].value_counts().head().to_dict(), 
-            "avgDailyFlights": daily_flights.mean().to_dict()
-        }
+async def cached_response(request, endpoint, params, compute):
+    """
+    Serve compute(snapshot) through the response cache, keyed by endpoint, query
+    params and dataset version. The body is compressed (brotli or gzip, per
+    Accept-Encoding) once per cached entry. Answers a matching If-None-Match with 304.
+    X-Snapshot-Version tells /events subscribers which updates the body already has.
 
-@app.get("/overview")
-def overview(origin: str = None, destination: str = None):
-    df = update_flights_database()
-    
-    if not df.empty:
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # Get CX flights for station lists
-        cx_df = df[df['airline'] == 'CPA']
-        
-        # Get station lists based on filters
-        if origin:
-            # If origin is selected, get only destinations that CX flies to from this origin
-            possible_destinations = sorted(cx_df[cx_df['origin'] == origin]['destination'].unique().tolist())
-            possible_origins = [origin]
-        elif destination:
-            # If destination is selected, get only origins that CX flies from to this destination
-            possible_origins = sorted(cx_df[cx_df['destination'] == destination]['origin'].unique().tolist())
-            possible_destinations = [destination]
-        else:
-            # If no filters, get all CX origins and destinations
-            possible_origins = sorted(cx_df['origin'].unique().tolist())
-            possible_destinations = sorted(cx_df['destination'].unique().tolist())
-        
-        # Filter for last month only
-        last_month = df['date'].max() - timedelta(days=30)
-        df_month = df[df['date'] >= last_month]
-        
-        # Apply route filters if provided
-        if origin:
-            df_month = df_month[df_month['origin'] == origin]
-        if destination:
-            df_month = df_month[df_month['destination'] == destination]
-        
-        # Filter for CX flights only for metrics
-        cx_df_month = df_month[df_month['airline'] == 'CPA']
-        
-        # Calculate metrics with filtered data
-        total_cx_flights = len(cx_df_month)
-        
-        if total_cx_flights > 0:
-            ontime_flights = len(cx_df_month[cx_df_month['status'] != 'Delayed'])
-            ontime_percentage = (ontime_flights / total_cx_flights * 100)
-            
-            active_routes = len(cx_df_month[['origin', 'destination']].drop_duplicates())
-            
-            cancelled_flights = len(cx_df_month[cx_df_month['status'] == 'Cancelled'])
-            cancellation_rate = (cancelled_flights / total_cx_flights * 100)
-        else:
-            ontime_percentage = 0
-            active_routes = 0
-            cancellation_rate = 0
-        
-        metrics = {
-            "total_flights": total_cx_flights,
-            "ontime_performance": round(ontime_percentage, 1),
-            "active_routes": active_routes,
-            "cancellation_rate": round(cancellation_rate, 1)
-        }
-        
-        # Set index for existing calculations
-        df_month.set_index('date', inplace=True)
-        
-        # Resampling and calculating weekly frequency
-        cx_weekly_counts = df_month[df_month['airline'] == 'CPA'].resample('W').size()
-        all_weekly_counts = df_month.resample('W').size()
-
-        # weekly performance: cod (cancelled or delayed) flights
-        condition_cx_cod = (df_month['airline'] == 'CPA') & (df_month['status'].isin(['Cancelled', 'Delayed']))
-        cx_weekly_cod_flights = df_month[condition_cx_cod].resample('W').size()
-        cx_cod_percentage = ((cx_weekly_cod_flights / cx_weekly_counts.replace(0, pd.NA)) * 100).fillna(0)
+    Cache hits are answered on the event loop. Misses and compression run on
+    the analytics executor, coalesced so that concurrent identical requests
+    share one computation. Profiled requests (?profile=1) always recompute,
+    so that their Server-Timing header shows where the time goes.
+    """
+    snapshot = store.snapshot()
+    if snapshot.empty:
+        return None
+    key = (endpoint, normalize_params(params), snapshot.version)
 
-        weekly_cod_flights = df_month[df_month['status'].isin(['Cancelled', 'Delayed'])].resample('W').size()
-        all_cod_percentage = ((weekly_cod_flights/all_weekly_counts.replace(0, pd.NA))*100).fillna(0)
+    def render():
+        with span('response.compute', endpoint=endpoint):
+            payload = compute(snapshot)
+        with span('response.encode', endpoint=endpoint):
+            body = dumps(payload)
+        return cache.put(key, body)
 
-        # weekly top 10
-        weekly_top_10 = df_month['airline'].resample('W').apply(
-            lambda x: ", ".join(f"{idx}({v})" for idx, v in x.value_counts().head(10).items())
-        )
-        df_split = weekly_top_10.str.split(", ", expand=True)
-        column_names = [f"No.{i}" for i in range(1, df_split.shape[1] + 1)]
-        df_split.columns = column_names
-        weekly_top_10 = df_split
-        weekly_top_10.index = weekly_top_10.index.strftime('%Y-%m-%d')
+    if profiling():
+        entry = await coalescer.run_alone(render)
+    else:
+        entry = cache.get(key)
+        if entry is None:
+            entry = await coalescer.run(key, render)
+    encoding = choose_encoding(request.headers.get('accept-encoding'))
+    if len(entry[0]) < MINIMUM_COMPRESS_SIZE:
+        encoding = None
+    variant = cache.variant(key, entry, encoding)
+    if variant is None:
+        variant = await coalescer.run((key, encoding), lambda: cache.encoded(key, entry, encoding))
+    body, etag = variant
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding", "X-Snapshot-Version": str(snapshot.version)}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
 
-        # weekly top 5
-        top_5 = df_month['airline'].resample('W').apply(lambda x: x.value_counts().head(5).to_dict().keys())
-        top_5 = top_5.reset_index()
-        top_5.columns = ['week', 'top_airlines']
-        top_5 = top_5.explode('top_airlines')
+def check_windows(windows, compare):
+    """Reject malformed window specs or comparisons with a 400 before touching the cache"""
+    if compare not in COMPARISONS:
+        raise HTTPException(status_code=400, detail=f"compare must be one of {', '.join(COMPARISONS)}")
+    try:
+        for window in windows:
+            check_window_spec(window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        partial_table = df_month[['airline','status']]
-        partial_table = partial_table.reset_index()
-        partial_table['date'] = pd.to_datetime(partial_table['date'])
-        partial_table['week'] = partial_table['date'] + pd.to_timedelta(6 - partial_table['date'].dt.weekday, unit='d')
+def check_count(count):
+    """Reject an unknown ?count= (movements or flight_numbers) with a 400"""
+    if count not in COUNTS:
+        raise HTTPException(status_code=400, detail=f"count must be one of {', '.join(COUNTS)}")
 
-        filtered_df = pd.merge(partial_table, top_5, how='inner', left_on=['week', 'airline'], right_on=['week', 'top_airlines'])
-        filtered_df.drop(columns=['top_airlines'], inplace=True)
-
-        filtered_df['week'] = pd.to_datetime(filtered_df['week'])
-        filtered_df.set_index('week', inplace=True)
-        weekly_top_5 = filtered_df['airline'].resample('W').apply(
-            lambda x: {idx: v for idx, v in x.value_counts().head(5).items()}
-        )
-
-        filtered_df = filtered_df[filtered_df['status'].isin(['Cancelled', 'Delayed'])]
+@app.get("/hkia")
+async def hkia(request: Request, count: str = MOVEMENTS):
+    check_count(count)
+    return await cached_response(request, 'hkia', {'count': count}, lambda snapshot: analytics.hkia_summary(snapshot, count))
 
-        # Resample and format the output
-        weekly_top_5_cod = filtered_df['airline'].resample('W').apply(
-            lambda x: {idx: v for idx, v in x.value_counts().head(5).items()}
-        )
+@app.get("/overview")
+async def overview(request: Request, origin: str = None, destination: str = None, carrier: str = analytics.FOCUS_CARRIER,
+                   count: str = MOVEMENTS):
+    check_count(count)
+    return await cached_response(
+        request, 'overview', {'origin': origin, 'destination': destination, 'carrier': carrier, 'count': count},
+        lambda snapshot: analytics.overview(snapshot, origin, destination, carrier, count)
+    )
+        
+@app.get("/stations")
+async def stations(request: Request, origin: str = None, destination: str = None, carrier: str = analytics.FOCUS_CARRIER,
+                   airline: str = Query(None, deprecated=True, description="Former name of carrier")):
+    if airline is not None:
+        carrier = airline
+    return await cached_response(
+        request, 'stations', {'origin': origin, 'destination': destination, 'carrier': carrier},
+        lambda snapshot: analytics.stations(snapshot, origin, destination, carrier)
+    )
 
-        # Convert dictionaries to Series
-        weekly_top_5 = pd.Series(weekly_top_5)
-        weekly_top_5_cod = pd.Series(weekly_top_5_cod)
+@app.get("/market-metrics")
+async def market_metrics(request: Request, window: str = DEFAULT_WINDOW, compare: str = 'previous', carrier: str = analytics.FOCUS_CARRIER,
+                         count: str = MOVEMENTS):
+    check_windows([window], compare)
+    check_count(count)
+    return await cached_response(
+        request, 'market-metrics', {'window': window, 'compare': compare, 'carrier': carrier, 'count': count},
+        lambda snapshot: analytics.market_metrics(snapshot, window, compare, carrier, count)
+    )
+        
+@app.get("/performance")
+async def performance(request: Request, window: str = DEFAULT_WINDOW, compare: str = 'previous', carrier: str = analytics.FOCUS_CARRIER,
+                      count: str = MOVEMENTS):
+    check_windows([window], compare)
+    check_count(count)
+    return await cached_response(
+        request, 'performance', {'window': window, 'compare': compare, 'carrier': carrier, 'count': count},
+        lambda snapshot: analytics.performance(snapshot, window, compare, carrier, count)
+    )
 
-        # Calculate ratios
-        ratios = {}
+@app.get("/kpis")
+async def kpis(request: Request, windows: str = '7d,30d,90d', compare: str = 'previous', carrier: str = analytics.FOCUS_CARRIER,
+               count: str = MOVEMENTS):
+    # Several windows in one round trip, e.g. /kpis?windows=7d,30d,month,2024-09-01:2024-09-30
+    specs = [spec.strip() for spec in windows.split(',') if spec.strip()]
+    check_windows(specs, compare)
+    check_count(count)
+    return await cached_response(
+        request, 'kpis', {'windows': ','.join(specs), 'compare': compare, 'carrier': carrier, 'count': count},
+        lambda snapshot: analytics.kpi_windows(snapshot, specs, compare, carrier, count)
+    )
 
-        for week, airlines in weekly_top_5.items():
-            week_ratios = []
-            cod_airlines = weekly_top_5_cod.get(week, {})
-            
-            for airline, count in airlines.items():
-                if airline in cod_airlines:
-                    ratio = round((cod_airlines[airline] / count) * 100)
-                else:
-                    ratio = 0
+@app.get("/carriers")
+async def carriers(request: Request, window: str = DEFAULT_WINDOW, compare: str = 'previous', carriers: str = None,
+                   count: str = MOVEMENTS):
+    # Every carrier's KPIs from one grouped pass, e.g. /carriers?window=7d or /carriers?carriers=CPA,HDA,UAE
+    check_windows([window], compare)
+    check_count(count)
+    selected = [carrier.strip() for carrier in (carriers or '').split(',') if carrier.strip()] or None
+    return await cached_response(
+        request, 'carriers', {'window': window, 'compare': compare, 'carriers': ','.join(selected or []), 'count': count},
+        lambda snapshot: analytics.carrier_kpis(snapshot, window, compare, selected, count)
+    )
 
-                week_ratios.append(f"{airline}({ratio}%)")
-            
-            ratios[week] = ', '.join(week_ratios)
+@app.get("/airports")
+async def airports(request: Request):
+    return await cached_response(request, 'airports', {}, analytics.airport_directory)
 
-        # Create a Pandas Series from the ratios dictionary
-        top5_ratios_series = pd.Series(ratios)
-        # Split the series into a DataFrame
-        df_split = top5_ratios_series.str.split(", ", expand=True)
+@app.get("/flights")
+async def flights(
+    start_date: date = None,
+    end_date: date = None,
+    flight_type: str = None,
+    airline: str = None,
+    origin: str = None,
+    destination: str = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(None, ge=1),
+    format: str = 'ndjson',
+):
+    """
+    Raw flight export, streamed chunk by chunk as NDJSON or an Arrow IPC stream.
+    X-Total-Count holds the number of matching rows, X-Next-Offset the offset
+    of the next page when limit cuts the result short.
+    """
+    if format not in flight_export.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(flight_export.EXPORT_FORMATS)}")
+    if format == 'arrow' and flight_export.pa is None:
+        raise HTTPException(status_code=501, detail="Arrow exports need pyarrow installed on the server")
+    snapshot = store.snapshot()
+    if snapshot.empty:
+        return None
+    total, frames = await asyncio.get_running_loop().run_in_executor(executor, lambda: snapshot.export(
+        offset, limit, start_date=start_date, end_date=end_date, flight_type=flight_type,
+        airline=airline, origin=origin, destination=destination,
+    ))
+    end = total if limit is None else min(total, offset + limit)
+    headers = {"X-Total-Count": str(total)}
+    if end < total:
+        headers["X-Next-Offset"] = str(end)
+    stream = flight_export.arrow_chunks if format == 'arrow' else flight_export.ndjson_chunks
+    return StreamingResponse(stream(frames), media_type=flight_export.MEDIA_TYPES[format], headers=headers)
 
-        # Generate column names based on the number of splits
-        column_names = [f"No.{i}" for i in range(1, df_split.shape[1] + 1)]
-        df_split.columns = column_names
-        weekly_top_5 = df_split
-        # Format the index to be date strings
-        weekly_top_5.index = weekly_top_5.index.strftime('%Y-%m-%d')
+@app.get("/events")
+async def events(request: Request):
+    """
+    Server-sent events with what each refresh changed on the dashboards' default
+    views (see event_stream). EventSource reconnects with Last-Event-ID and is
+    sent the updates it missed.
+    """
+    return StreamingResponse(
+        broadcaster.stream(request.headers.get('last-event-id')), media_type='text/event-stream',
+        # No-buffering hint for nginx-style proxies, which would otherwise hold events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        return {
-            "metrics": metrics,
-            "dates": cx_weekly_counts.index.strftime('%Y-%m-%d').tolist(),
-            "CX_weekly_fq": cx_weekly_counts.tolist(),
-            "ALL_weekly_fq": all_weekly_counts.tolist(),
-            "CX_weekly_cod_percentage": cx_cod_percentage.tolist(),
-            "ALL_weekly_cod_percentage": all_cod_percentage.tolist(),
-            "weekly_top_10": weekly_top_10.to_json(orient='split'),
-            "weekly_top_5": weekly_top_5.to_json(orient='split'),
-            "stations": {
-                "origins": possible_origins,
-                "destinations": possible_destinations
-            }
-        }
-        
-@app.get("/market-metrics")
-def market_metrics():
-    df = update_flights_database()
-    
-    if not df.empty:
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # Get current month and last month
-        latest_date = df['date'].max()
-        current_month_start = latest_date - timedelta(days=30)
-        last_month_start = current_month_start - timedelta(days=30)
-        
-        # Filter dataframes for current and last month
-        current_month_df = df[(df['date'] >= current_month_start) & (df['date'] <= latest_date)]
-        last_month_df = df[(df['date'] >= last_month_start) & (df['date'] < current_month_start)]
-        
-        # Market Share Calculation
-        def calculate_market_share(df):
-            non_cancelled_flights = df[df['status'] != 'Cancelled']
-            cx_flights = non_cancelled_flights[non_cancelled_flights['airline'] == 'CPA']
-            return (len(cx_flights) / len(non_cancelled_flights) * 100) if len(non_cancelled_flights) > 0 else 0
-        
-        current_market_share = calculate_market_share(current_month_df)
-        last_market_share = calculate_market_share(last_month_df)
-        market_share_change = current_market_share - last_market_share
-        
-        # Routes Served Calculation
-        def count_unique_routes(df):
-            cx_routes = df[df['airline'] == 'CPA'][['origin', 'destination']].drop_duplicates()
-            return len(cx_routes)
-        
-        current_routes = count_unique_routes(current_month_df)
-        last_routes = count_unique_routes(last_month_df)
-        routes_change = current_routes - last_routes
-        
-        # Competitor Count Calculation
-        def count_competitors(df):
-            return df[df['airline'] != 'CPA']['airline'].nunique()
-        
-        current_competitors = count_competitors(current_month_df)
-        last_competitors = count_competitors(last_month_df)
-        competitors_change = current_competitors - last_competitors
-        
-        # Market Growth Calculation (based on total flights)
-        current_total_flights = len(current_month_df[current_month_df['status'] != 'Cancelled'])
-        last_total_flights = len(last_month_df[last_month_df['status'] != 'Cancelled'])
-        market_growth = ((current_total_flights - last_total_flights) / last_total_flights * 100) if last_total_flights > 0 else 0
-        
-        return {
-            "market_share": {
-                "value": round(current_market_share, 1),
-                "change": round(market_share_change, 1)
-            },
-            "routes_served": {
-                "value": current_routes,
-                "change": routes_change
-            },
-            "competitor_count": {
-                "value": current_competitors,
-                "change": competitors_change
-            },
-            "market_growth": {
-                "value": round(market_growth, 1)
-            }
-        }
-        
-@app.get("/performance")
-def performance():
-    df = update_flights_database()
-    
-    if not df.empty:
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # Get current month and last month
-        latest_date = df['date'].max()
-        current_month_start = latest_date - timedelta(days=30)
-        last_month_start = current_month_start - timedelta(days=30)
-        
-        # Filter for current and last month
-        current_df = df[df['date'] >= current_month_start]
-        last_month_df = df[(df['date'] >= last_month_start) & (df['date'] < current_month_start)]
-        
-        # Filter for CX flights
-        current_cx = current_df[current_df['airline'] == 'CPA']
-        last_month_cx = last_month_df[last_month_df['airline'] == 'CPA']
-        
-        # Average Daily Flights
-        current_daily_avg = len(current_cx) / 30
-        last_daily_avg = len(last_month_cx) / 30
-        daily_flights_change = ((current_daily_avg - last_daily_avg) / last_daily_avg * 100) if last_daily_avg > 0 else 0
-        
-        # On-time Performance (flights that are not delayed)
-        current_ontime = len(current_cx[current_cx['status'] != 'Delayed'])
-        current_ontime_rate = (current_ontime / len(current_cx) * 100) if len(current_cx) > 0 else 0
-        
-        last_ontime = len(last_month_cx[last_month_cx['status'] != 'Delayed'])
-        last_ontime_rate = (last_ontime / len(last_month_cx) * 100) if len(last_month_cx) > 0 else 0
-        ontime_change = current_ontime_rate - last_ontime_rate
-        
-        # Average Delay Time (assuming 60 min for delayed flights)
-        delay_minutes = 60
-        current_delayed_flights = len(current_cx[current_cx['status'] == 'Delayed'])
-        last_delayed_flights = len(last_month_cx[last_month_cx['status'] == 'Delayed'])
-        
-        current_avg_delay = (current_delayed_flights * delay_minutes) / len(current_cx) if len(current_cx) > 0 else 0
-        last_avg_delay = (last_delayed_flights * delay_minutes) / len(last_month_cx) if len(last_month_cx) > 0 else 0
-        delay_change = current_avg_delay - last_avg_delay
-        
-        # Completion Factor (non-cancelled flights)
-        current_completed = len(current_cx[current_cx['status'] != 'Cancelled'])
-        current_completion = (current_completed / len(current_cx) * 100) if len(current_cx) > 0 else 0
-        
-        last_completed = len(last_month_cx[last_month_cx['status'] != 'Cancelled'])
-        last_completion = (last_completed / len(last_month_cx) * 100) if len(last_month_cx) > 0 else 0
-        completion_change = current_completion - last_completion
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of the stage timings plus cache and dataset gauges"""
+    snapshot = store.snapshot()
+    stats = cache.stats()
+    gauges = {
+        "cargoprism_snapshot_version": ("Version of the published flight snapshot", snapshot.version),
+        "cargoprism_snapshot_flights": ("Flights in the published snapshot", snapshot.flight_count),
+        "cargoprism_cache_entries": ("Entries in the response cache", stats["entries"]),
+        "cargoprism_cache_bytes": ("Bytes held by the response cache", stats["bytes"]),
+        "cargoprism_cache_hits": ("Response cache hits since start", stats["hits"]),
+        "cargoprism_cache_misses": ("Response cache misses since start", stats["misses"]),
+        "cargoprism_coalesced_requests": ("Requests that shared an in-flight computation", coalescer.coalesced),
+        "cargoprism_event_subscribers": ("Open /events streams", broadcaster.subscriber_count()),
+    }
+    return PlainTextResponse(registry.render() + render_gauges(gauges), media_type='text/plain; version=0.0.4')
 
-        # Schedule Changes Analysis - Tracking Cancellations and Resumptions
-        competitor_df = df[df['airline'] != 'CPA'].copy()
-        competitor_df = competitor_df[competitor_df['date'] >= current_month_start]  # Limit to last month
-        schedule_changes = []
-        
-        # Group by flight number and find cancelled flights
-        for flight_no in competitor_df['flight_no'].unique():
-            flight_data = competitor_df[competitor_df['flight_no'] == flight_no].sort_values('date')
-            
-            # Find cancellations and next scheduled flight
-            for idx, row in flight_data.iterrows():
-                if row['status'] == 'Cancelled':
-                    # Look for the next scheduled occurrence of this flight
-                    next_flights = flight_data[flight_data['date'] > row['date']]
-                    if not next_flights.empty:
-                        next_scheduled = next_flights.iloc[0]
-                        schedule_changes.append({
-                            "date": row['date'].strftime('%Y-%m-%d'),
-                            "flight_no": flight_no,
-                            "airline": row['airline'],
-                            "original_status": "Cancelled",
-                            "new_status": f"Resumed on {next_scheduled['date'].strftime('%Y-%m-%d')}"
-                        })
-        
-        # Sort schedule changes by date
-        schedule_changes.sort(key=lambda x: x['date'], reverse=True)
-        
-        # Prepare the data for return
-        if schedule_changes:
-            schedule_data = [
-                [
-                    change['date'],
-                    change['flight_no'],
-                    change['airline'],
-                    change['original_status'],
-                    change['new_status']
-                ] for change in schedule_changes
-            ]
-        else:
-            schedule_data = ["None"]
+@app.get("/status")
+async def status():
+    """When the flight data was last refreshed (by any worker), how long it took, and this worker's view"""
+    return await asyncio.get_running_loop().run_in_executor(executor, store.scheduler.status)
 
-        return {
-            "metrics": {
-                "daily_flights": {
-                    "value": round(current_daily_avg, 1),
-                    "change": round(daily_flights_change, 1)
-                },
-                "ontime_performance": {
-                    "value": round(current_ontime_rate, 1),
-                    "change": round(ontime_change, 1)
-                },
-                "avg_delay": {
-                    "value": round(current_avg_delay, 1),
-                    "change": round(delay_change, 1)
-                },
-                "completion_factor": {
-                    "value": round(current_completion, 1),
-                    "change": round(completion_change, 1)
-                }
-            },
-            "schedule_changes": {
-                "columns": ["Date", "Flight No", "Airline", "Original Status", "New Status"],
-                "data": schedule_data
-            }
-        }
\ No newline at end of file
+@app.get("/cache-stats")
+async def cache_stats():
+    return {**cache.stats(), "computations": coalescer.stats()}
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+# "At gate 23:56 (06/08/2024)", "Dep 04:48", "Est at 20:29 (07/11/2024)", "Cancelled", "Delayed", ""
+STATUS_PATTERN = r'^\s*(?P<category>[^\d(]*?)\s*(?P<time>\d{1,2}:\d{2})?\s*(?:\((?P<day>\d{2}/\d{2}/\d{4})\))?\s*$'
+# Statuses whose time is HKIA's estimate, not when the flight actually arrived or left
+ESTIMATED_CATEGORIES = ('Est at',)
+# Flights arriving at gate / departing more than this late count as late (kpi_engine's late_rate)
+ONTIME_THRESHOLD_MINUTES = 15
+
+
+def parse_status_values(values):
+    """
+    Split distinct status strings into category, minutes after midnight and
+    the rolled-over day, which HKIA only prints when it differs from the
+    scheduled date. Estimated times (ESTIMATED_CATEGORIES) are left out.
+    """
+    values = pd.Series(values, dtype=object)
+    parts = values.str.extract(STATUS_PATTERN)
+    category = parts['category'].where(parts['category'].fillna('') != '', 'Unknown')
+    hours_minutes = parts['time'].str.split(':', expand=True)
+    if hours_minutes.shape[1] == 2:
+        minutes = hours_minutes[0].astype(float) * 60 + hours_minutes[1].astype(float)
+    else:
+        minutes = pd.Series(np.nan, index=values.index)
+    day = pd.to_datetime(parts['day'], format='%d/%m/%Y', errors='coerce')
+    actual = ~category.isin(ESTIMATED_CATEGORIES)
+    minutes, day = minutes.where(actual), day.where(actual)
+    return pd.DataFrame({'category': category, 'minutes': minutes, 'day': day})
+
+
+def parse_statuses(status, scheduled):
+    """
+    Vectorized parse of the status column against the scheduled datetime.
+
+    Each distinct status string is parsed once (the column is treated as a
+    categorical) and broadcast to the rows by category code. Returns a frame
+    aligned with status holding status_category, actual_datetime (the time in
+    the status, on the rolled-over date if one is given) and delay_minutes
+    (actual minus scheduled, NaN when the status carries no actual time, as
+    with "Est at" estimates).
+    """
+    if not isinstance(status.dtype, pd.CategoricalDtype):
+        status = status.astype('category')
+    # A trailing empty row so that code -1 (missing status) parses as "Unknown"
+    parsed = parse_status_values(status.cat.categories).reindex(range(len(status.cat.categories) + 1))
+    parsed['category'] = parsed['category'].fillna('Unknown')
+    codes = status.cat.codes.to_numpy()
+
+    categories = parsed['category'].astype('category')
+    category = pd.Categorical.from_codes(categories.cat.codes.to_numpy()[codes], categories.cat.categories)
+    minutes = parsed['minutes'].to_numpy()[codes]
+    day = parsed['day'].to_numpy()[codes]
+
+    scheduled = pd.to_datetime(scheduled)
+    actual_day = np.where(pd.isna(day), scheduled.dt.normalize().to_numpy(), day)
+    actual = pd.Series(actual_day, index=status.index) + pd.to_timedelta(minutes, unit='m')
+    delay = (actual - scheduled) / pd.Timedelta(minutes=1)
+    return pd.DataFrame({
+        'status_category': category,
+        'actual_datetime': actual,
+        'delay_minutes': delay.astype('float32'),
+    }, index=status.index)
@@ -0,0 +1,68 @@
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+STUB_PATH = '/flightinfo-rest/rest/flights/past'
+
+
+def load_recorded_pages(filename='hk_flights_raw.json'):
+    """
+    Load pages recorded by test.py (a list of {'date', 'type', 'data'} entries)
+    into a dict keyed by (date, flight_type)
+    """
+    with open(filename, encoding='utf-8') as f:
+        entries = json.load(f)
+    return {(entry['date'], entry['type']): entry['data'] for entry in entries}
+
+
+def make_handler(pages):
+    class RecordedPagesHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != STUB_PATH:
+                self._send(404, {'error': 'not found'})
+                return
+            query = parse_qs(url.query)
+            date = query.get('date', [''])[0]
+            flight_type = 'arrival' if query.get('arrival', ['true'])[0] == 'true' else 'departure'
+            self._send(200, pages.get((date, flight_type), []))
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return RecordedPagesHandler
+
+
+def start_stub_server(pages, host='127.0.0.1', port=0):
+    """
+    Serve recorded pages on a background thread.
+    Returns (server, base_url); pass base_url to IngestionEngine and call server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(pages))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f'http://{host}:{server.server_address[1]}{STUB_PATH}'
+    return server, base_url
+
+
+if __name__ == '__main__':
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'hk_flights_raw.json'
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8001
+    server, base_url = start_stub_server(load_recorded_pages(filename), port=port)
+    print(f"Replaying {filename} at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,72 @@
+import json
+import os
+from datetime import datetime, timedelta
+from ingestion import FLIGHT_TYPES
+
+# The flightinfo-rest "past" endpoint serves roughly this many days of history
+HISTORY_DAYS = 89
+# A page fetched at least this many days after its date is final: late statuses
+# such as "Est at 22:45 (07/11/2024)" or "Delayed" have resolved by then
+SETTLE_DAYS = 2
+
+
+class SyncManifest:
+    """
+    Record of which (date, flight_type) pages have been fetched, when, and how
+    many rows they held. Stored as JSON next to the partitions.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.pages = json.load(f)
+
+    def get(self, date, flight_type):
+        return self.pages.get(date, {}).get(flight_type)
+
+    def record(self, date, flight_type, rows, fetched_at):
+        self.pages.setdefault(date, {})[flight_type] = {
+            'fetched_at': fetched_at.isoformat(timespec='seconds'),
+            'rows': rows,
+        }
+
+    def bootstrap(self, storage):
+        """Register partitions that predate the manifest, using the file mtime as fetch time"""
+        for date, flight_type in storage.partitions():
+            if self.get(date, flight_type) is None:
+                path = storage.partition_path(date, flight_type)
+                fetched_at = datetime.fromtimestamp(os.path.getmtime(path))
+                self.record(date, flight_type, None, fetched_at)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.pages, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def is_final(date, entry):
+    """A page is final once it was fetched SETTLE_DAYS or more after its date"""
+    fetched_at = datetime.fromisoformat(entry['fetched_at'])
+    return fetched_at.date() >= (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=SETTLE_DAYS)).date()
+
+
+def plan_sync(manifest, now=None, history_days=HISTORY_DAYS):
+    """
+    Decide which (date, flight_type) pages to fetch: every day in the API's
+    history window up to and including today that was never fetched, plus the
+    recent days whose last fetch happened before their statuses settled.
+    """
+    if now is None:
+        now = datetime.now()
+    plan = []
+    for offset in range(history_days, -1, -1):
+        date = (now - timedelta(days=offset)).strftime('%Y-%m-%d')
+        for flight_type in FLIGHT_TYPES:
+            entry = manifest.get(date, flight_type)
+            if entry is None or not is_final(date, entry):
+                plan.append((date, flight_type))
+    return plan
@@ -0,0 +1,175 @@
+"""
+Synthetic HKIA flight tables and raw pages for benchmarks.
+
+generate_flights() returns rows in the stored schema (flight_storage.COLUMNS)
+with the status strings HKIA publishes: "At gate 23:56", "Dep 04:48 (06/08/2024)",
+"Est at 20:29", "Cancelled", "Delayed" and "". Airline sizes, station counts,
+hour-of-day and delay distributions follow the recorded history; CPA is
+present with about the share it has there.
+"""
+import string
+import numpy as np
+import pandas as pd
+from airport_index import get_airport_index
+from flight_storage import COLUMNS, KEY_COLUMNS
+
+# Recorded history averages about 240 flights a day over ~76 airlines and ~150 stations
+ROWS_PER_DAY = 250
+AIRLINES = 80
+STATIONS = 150
+ROUTES_PER_AIRLINE = (2, 25)
+FOCUS_AIRLINE = ('CPA', 'CX')
+FOCUS_SHARE = 0.11
+# Share of scheduled flights per hour of day, from the recorded history
+HOUR_WEIGHTS = [48, 76, 34, 80, 55, 41, 41, 59, 36, 25, 30, 31, 32, 33, 38, 43, 42, 37, 39, 39, 38, 39, 25, 39]
+# Status kinds and their shares
+CANCELLED_SHARE = 0.10
+DELAYED_SHARE = 0.0015
+BLANK_SHARE = 0.004
+ESTIMATED_SHARE = 0.005
+HKG_NAME = 'Hong Kong International Airport'
+# 'HH:MM' for every minute of the day; formatting by lookup is far faster than strftime
+CLOCK = np.array([f'{minute // 60:02d}:{minute % 60:02d}' for minute in range(24 * 60)], dtype=object)
+
+
+def _clock(timestamps):
+    return CLOCK[(timestamps.hour * 60 + timestamps.minute).to_numpy()]
+
+
+def _day_strings(timestamps, fmt):
+    """strftime(fmt) of each timestamp's day, formatting every distinct day once"""
+    codes, days = pd.factorize(timestamps.normalize())
+    return days.strftime(fmt).to_numpy(dtype=object)[codes]
+
+
+def _codes(rng, count, length, alphabet, taken=()):
+    codes = set(taken)
+    result = []
+    while len(result) < count:
+        code = ''.join(rng.choice(list(alphabet), size=length))
+        if code not in codes:
+            codes.add(code)
+            result.append(code)
+    return result
+
+
+def _stations(rng, count):
+    """(codes, names) of count stations, real airports from iata.json where available"""
+    index = get_airport_index()
+    names = {code: name for code, name in index.names().items()
+             if code and code != 'HKG' and name and 'International' in name}
+    if len(names) >= count:
+        codes = sorted(str(code) for code in rng.choice(sorted(names), size=count, replace=False))
+        return codes, [names[code] for code in codes]
+    codes = _codes(rng, count, 3, string.ascii_uppercase, taken={'HKG'})
+    return codes, [f'Airport {code}' for code in codes]
+
+
+def _network(rng):
+    """
+    Airlines with Zipf-like sizes, each flying a handful of routes with fixed
+    flight numbers. Returns a frame of routes (airline, prefix, flight_no,
+    station, station_name, flight_type, weight).
+    """
+    airlines = [FOCUS_AIRLINE[0]] + _codes(rng, AIRLINES - 1, 3, string.ascii_uppercase, taken={FOCUS_AIRLINE[0]})
+    prefixes = [FOCUS_AIRLINE[1]] + _codes(rng, AIRLINES - 1, 2, string.ascii_uppercase + string.digits, taken={FOCUS_AIRLINE[1]})
+    sizes = 1 / np.arange(1, AIRLINES) ** 0.7
+    sizes = np.concatenate([[FOCUS_SHARE], sizes / sizes.sum() * (1 - FOCUS_SHARE)])
+    stations, station_names = _stations(rng, STATIONS)
+    station_weights = 1 / np.arange(1, STATIONS + 1) ** 0.7
+    station_weights /= station_weights.sum()
+
+    routes = []
+    for airline, prefix, size in zip(airlines, prefixes, sizes):
+        count = int(np.clip(round(size * 250), *ROUTES_PER_AIRLINE))
+        chosen = rng.choice(STATIONS, size=min(count, STATIONS), replace=False, p=station_weights)
+        numbers = rng.choice(9000, size=len(chosen) * 2, replace=False) + 1
+        route_weights = rng.dirichlet(np.ones(len(chosen))) * size
+        for i, station in enumerate(chosen):
+            for j, flight_type in enumerate(('arrival', 'departure')):
+                routes.append((airline, f'{prefix} {numbers[2 * i + j]:03d}', stations[station],
+                               station_names[station], flight_type, route_weights[i] / 2))
+    routes = pd.DataFrame(routes, columns=['airline', 'flight_no', 'station', 'station_name', 'flight_type', 'weight'])
+    routes['weight'] /= routes['weight'].sum()
+    return routes
+
+
+def _statuses(rng, flight_type, scheduled):
+    """HKIA status strings for flights of one type scheduled at the given datetimes"""
+    count = len(scheduled)
+    # Most flights run close to schedule; a heavy tail runs hours late
+    late = rng.random(count) < 0.3
+    delay = np.where(late, np.exp(rng.normal(4.5, 1.2, count)), rng.normal(5, 20, count))
+    actual = scheduled + pd.to_timedelta(np.round(np.minimum(delay, 2880)), unit='m')
+    prefix = np.where(flight_type == 'arrival', 'At gate ', 'Dep ')
+    kind = rng.random(count)
+    prefix = np.where(kind < ESTIMATED_SHARE, 'Est at ', prefix)
+
+    status = pd.Series(prefix, dtype=object) + _clock(actual)
+    rolled = actual.normalize() != scheduled.normalize()
+    status = status.where(~rolled, status + ' (' + _day_strings(actual, '%d/%m/%Y') + ')')
+    cancelled = kind > 1 - CANCELLED_SHARE
+    status[cancelled] = 'Cancelled'
+    status[(kind >= ESTIMATED_SHARE) & (kind < ESTIMATED_SHARE + DELAYED_SHARE)] = 'Delayed'
+    blank = (kind >= ESTIMATED_SHARE + DELAYED_SHARE) & (kind < ESTIMATED_SHARE + DELAYED_SHARE + BLANK_SHARE)
+    status[blank] = ''
+    return status.to_numpy()
+
+
+def generate_flights(rows, days=None, end_date='2024-11-07', seed=0):
+    """
+    About `rows` synthetic flights (exact key duplicates are dropped, as
+    storage would) spread over `days` days ending on end_date; by default the
+    history grows with the row count at ROWS_PER_DAY. Sorted by datetime like
+    FlightStorage.load().
+    """
+    rng = np.random.default_rng(seed)
+    days = days or max(1, rows // ROWS_PER_DAY)
+    routes = _network(rng)
+    picked = routes.iloc[rng.choice(len(routes), size=rows, p=routes['weight'].to_numpy())].reset_index(drop=True)
+
+    dates = pd.Timestamp(end_date) - pd.to_timedelta(rng.integers(0, days, rows), unit='D')
+    hour_weights = np.array(HOUR_WEIGHTS, dtype=float) / sum(HOUR_WEIGHTS)
+    minutes = rng.choice(24, size=rows, p=hour_weights) * 60 + rng.integers(0, 12, rows) * 5
+    scheduled = pd.DatetimeIndex(dates + pd.to_timedelta(minutes, unit='m'))
+    flight_type = picked['flight_type'].to_numpy()
+    arrival = flight_type == 'arrival'
+
+    df = pd.DataFrame({
+        'date': _day_strings(scheduled, '%Y-%m-%d'),
+        'time': _clock(scheduled),
+        'flight_no': picked['flight_no'],
+        'airline': picked['airline'],
+        'origin': picked['station'].where(arrival, 'HKG'),
+        'destination': picked['station'].where(~arrival, 'HKG'),
+        'origin_name': picked['station_name'].where(arrival, HKG_NAME),
+        'destination_name': picked['station_name'].where(~arrival, HKG_NAME),
+        'status': _statuses(rng, flight_type, scheduled),
+        'flight_type': flight_type,
+        'datetime': scheduled,
+        'codeshare': np.zeros(rows, dtype='int8'),
+    })
+    df = df.drop_duplicates(subset=KEY_COLUMNS, keep='last')
+    df = df.sort_values('datetime', ascending=True, kind='stable').reset_index(drop=True)
+    return df[COLUMNS]
+
+
+def to_raw_pages(df):
+    """
+    The flightinfo-rest pages HKIA would have served for these flights, as
+    {(date, flight_type): page}, for parse_hk_flights(). Codeshare rows are
+    listed under the flight of the operating row before them.
+    """
+    pages = {}
+    for (date, flight_type), group in df.groupby(['date', 'flight_type'], sort=True):
+        station_field, stations = ('origin', group['origin']) if flight_type == 'arrival' else ('destination', group['destination'])
+        flights = []
+        for time, status, flight_no, airline, station, codeshare in zip(
+            group['time'], group['status'], group['flight_no'], group['airline'], stations, group['codeshare']
+        ):
+            if codeshare and flights:
+                flights[-1]['flight'].append({'no': flight_no, 'airline': airline})
+            else:
+                flights.append({'time': time, 'status': status, 'flight': [{'no': flight_no, 'airline': airline}], station_field: [station]})
+        pages[(date, flight_type)] = [{'date': date, 'list': flights}]
+    return pages
@@ -0,0 +1,82 @@
+// Dashboard updates pushed by the backend's /events stream (see backend/event_stream.py).
+// All pages share one EventSource; it reconnects on its own and the server
+// replays the updates missed in between, or sends a reset if it cannot.
+const API_URL = 'http://localhost:8000';
+
+let source = null;
+let latestVersion = 0;
+const subscribers = new Set();
+
+const isObject = (value) => value !== null && typeof value === 'object' && !Array.isArray(value);
+
+// Apply a JSON merge patch (RFC 7386), returning the patched copy of target
+export function applyMergePatch(target, patch) {
+  if (!isObject(patch)) return patch;
+  const result = isObject(target) ? { ...target } : {};
+  Object.entries(patch).forEach(([key, value]) => {
+    if (value === null) {
+      delete result[key];
+    } else {
+      result[key] = applyMergePatch(result[key], value);
+    }
+  });
+  return result;
+}
+
+// Apply an update's schedule_changes to the rows of the /performance schedule-change table
+export function applyRowChanges(rows, changes) {
+  const removed = new Set(changes.removed);
+  const next = (rows[0] === 'None' ? [] : rows).filter((_, index) => !removed.has(index));
+  changes.added.forEach(([index, row]) => next.splice(index, 0, row));
+  return next.length ? next : ['None'];
+}
+
+// GET an endpoint, resolving to { data, version }: the payload and the snapshot
+// version it was computed from. Fetches again if an update newer than the
+// response went by meanwhile, so no update falls between fetch and subscription.
+export function fetchLatest(path) {
+  return fetch(`${API_URL}${path}`, {
+    method: 'GET',
+    headers: {
+      'Accept': 'application/json',
+    },
+  })
+    .then(response => response.json().then(data => ({
+      data,
+      version: Number(response.headers.get('X-Snapshot-Version')),
+    })))
+    .then(result => (result.version < latestVersion ? fetchLatest(path) : result));
+}
+
+function openSource() {
+  source = new EventSource(`${API_URL}/events`);
+  const track = (event) => {
+    const data = JSON.parse(event.data);
+    latestVersion = Math.max(latestVersion, data.version);
+    return data;
+  };
+  source.addEventListener('ready', track);
+  source.addEventListener('update', (event) => {
+    const update = track(event);
+    subscribers.forEach(subscriber => subscriber.onUpdate(update));
+  });
+  source.addEventListener('reset', (event) => {
+    track(event);
+    subscribers.forEach(subscriber => subscriber.onReset());
+  });
+}
+
+// Call onUpdate(update) for each refresh's changes and onReset() when the
+// page has to refetch instead. Returns the unsubscribe function, for useEffect.
+export function subscribeToUpdates(onUpdate, onReset) {
+  const subscriber = { onUpdate, onReset };
+  subscribers.add(subscriber);
+  if (source === null) openSource();
+  return () => {
+    subscribers.delete(subscriber);
+    if (subscribers.size === 0) {
+      source.close();
+      source = null;
+    }
+  };
+}
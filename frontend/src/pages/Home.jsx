@@ -12,8 +12,9 @@ import {
   Legend,
 } from 'chart.js';
 import chartTheme from '../config/chartTheme';
+import { applyMergePatch, fetchLatest, subscribeToUpdates } from '../liveUpdates';
 import './Home.css';
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 
 ChartJS.register(
   CategoryScale,
@@ -158,24 +159,29 @@ function Home() {
     datasets: []
   });
 
+  // The filters selected and the payload shown (with the filters and snapshot version it is for),
+  // for the update subscription below
+  const filtersRef = useRef(filters);
+  const dataRef = useRef({ data: null, version: null, filters: null });
+
+  const showData = (data, version, shownFilters) => {
+    dataRef.current = { data, version, filters: shownFilters };
+    setRawData(data);
+    setStations(data.stations);
+    updateFilteredData(data);
+  };
+
   const fetchData = (currentFilters) => {
-    let url = 'http://localhost:8000/overview';
+    filtersRef.current = currentFilters;
     const params = new URLSearchParams();
     if (currentFilters.origin) params.append('origin', currentFilters.origin);
     if (currentFilters.destination) params.append('destination', currentFilters.destination);
-    if (params.toString()) url += `?${params.toString()}`;
+    const path = params.toString() ? `/overview?${params.toString()}` : '/overview';
 
-    fetch(url, {
-      method: 'GET',
-      headers: {
-        'Accept': 'application/json',
-      },
-    })
-      .then(response => response.json())
-      .then(data => {
-        setRawData(data);
-        setStations(data.stations);
-        updateFilteredData(data);
+    fetchLatest(path)
+      .then(({ data, version }) => {
+        // A newer filter selection may have been fetched meanwhile
+        if (currentFilters === filtersRef.current) showData(data, version, currentFilters);
       })
       .catch(error => {
         console.error('Error fetching data:', error);
@@ -184,6 +190,16 @@ function Home() {
 
   useEffect(() => {
     fetchData(filters);
+    return subscribeToUpdates(update => {
+      const { data, version, filters: shownFilters } = dataRef.current;
+      if (data === null || update.version <= version) return;
+      if (shownFilters !== filtersRef.current || shownFilters.origin || shownFilters.destination) {
+        // Updates patch the unfiltered overview only; anything else is fetched again
+        fetchData(filtersRef.current);
+      } else {
+        showData(applyMergePatch(data, update.patches.overview), update.version, shownFilters);
+      }
+    }, () => fetchData(filtersRef.current));
   }, []);
 
   const updateFilteredData = (data) => {
@@ -231,23 +247,23 @@ function Home() {
       ]
     });
 
-    const top10 = JSON.parse(data.weekly_top_10);
-    const columns = ["Date", ...top10.columns];
-    const formattedTop10Data = top10.index.map((date, index) => {
-      return [date, ...top10.data[index]];
-    });
+    const rankColumns = (size) => Array.from({ length: size }, (_, i) => `No.${i + 1}`);
+
+    const formattedTop10Data = data.weekly_top_10.map(({ week, airlines }) => [
+      week,
+      ...airlines.map(({ airline, flights }) => `${airline}(${flights})`)
+    ]);
     setTop10Data({
-      labels: columns,
+      labels: ['Date', ...rankColumns(10)],
       datasets: formattedTop10Data
     });
 
-    const top5 = JSON.parse(data.weekly_top_5);
-    const top5_columns = ["Date", ...top5.columns];
-    const formattedTop5Data = top5.index.map((date, index) => {
-      return [date, ...top5.data[index]];
-    });
+    const formattedTop5Data = data.weekly_top_5.map(({ week, airlines }) => [
+      week,
+      ...airlines.map(({ airline, cod_percentage }) => `${airline}(${cod_percentage}%)`)
+    ]);
     setTop5Data({
-      labels: top5_columns,
+      labels: ['Date', ...rankColumns(5)],
       datasets: formattedTop5Data
     });
   };
@@ -1,6 +1,6 @@
 import React from 'react';
 import { Line, Bar, Doughnut } from 'react-chartjs-2';
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import {
   Chart as ChartJS,
   CategoryScale,
@@ -14,6 +14,7 @@ import {
   Legend,
 } from 'chart.js';
 import chartTheme from '../config/chartTheme';
+import { applyMergePatch, fetchLatest, subscribeToUpdates } from '../liveUpdates';
 import './Market.css';
 
 ChartJS.register(
@@ -36,20 +37,27 @@ function MarketAnalysis() {
     market_growth: { value: 0 }
   });
 
-  useEffect(() => {
-    fetch('http://localhost:8000/market-metrics', {
-      method: 'GET',
-      headers: {
-        'Accept': 'application/json',
-      },
-    })
-      .then(response => response.json())
-      .then(data => {
+  // Snapshot version the metrics are at, so pushed updates they already include are skipped
+  const versionRef = useRef(null);
+
+  const fetchData = () => {
+    fetchLatest('/market-metrics')
+      .then(({ data, version }) => {
+        versionRef.current = version;
         setMetrics(data);
       })
       .catch(error => {
         console.error('Error fetching market metrics:', error);
       });
+  };
+
+  useEffect(() => {
+    fetchData();
+    return subscribeToUpdates(update => {
+      if (versionRef.current === null || update.version <= versionRef.current) return;
+      versionRef.current = update.version;
+      setMetrics(prev => applyMergePatch(prev, update.patches['market-metrics']));
+    }, fetchData);
   }, []);
 
   const marketShareData = {
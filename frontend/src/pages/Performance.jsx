@@ -1,5 +1,5 @@
 import React from 'react';
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Line, Bar } from 'react-chartjs-2';
 import {
   Chart as ChartJS,
@@ -13,6 +13,7 @@ import {
   Legend,
 } from 'chart.js';
 import chartTheme from '../config/chartTheme';
+import { applyMergePatch, applyRowChanges, fetchLatest, subscribeToUpdates } from '../liveUpdates';
 import './Performance.css';
 
 ChartJS.register(
@@ -42,21 +43,30 @@ function Performance() {
   const [currentPage, setCurrentPage] = useState(0);
   const rowsPerPage = 3;
 
-  useEffect(() => {
-    fetch('http://localhost:8000/performance', {
-      method: 'GET',
-      headers: {
-        'Accept': 'application/json',
-      },
-    })
-      .then(response => response.json())
-      .then(data => {
+  // Snapshot version the data is at, so pushed updates it already includes are skipped
+  const versionRef = useRef(null);
+
+  const fetchData = () => {
+    fetchLatest('/performance')
+      .then(({ data, version }) => {
+        versionRef.current = version;
         setMetrics(data.metrics);
         setScheduleChanges(data.schedule_changes);
       })
       .catch(error => {
         console.error('Error fetching performance data:', error);
       });
+  };
+
+  useEffect(() => {
+    fetchData();
+    return subscribeToUpdates(update => {
+      if (versionRef.current === null || update.version <= versionRef.current) return;
+      versionRef.current = update.version;
+      // The patch is against the whole /performance payload; the table comes as row changes
+      setMetrics(prev => applyMergePatch({ metrics: prev }, update.patches.performance).metrics);
+      setScheduleChanges(prev => ({ ...prev, data: applyRowChanges(prev.data, update.schedule_changes) }));
+    }, fetchData);
   }, []);
 
   const renderScheduleChangesTable = () => {